@@ -0,0 +1,33 @@
+"""Feat: Add indexes on foreign keys and token columns
+
+Revision ID: 3c9e5d71a2b4
+Revises: aaaf4ed0b3f5
+Create Date: 2026-10-18 10:12:31.418207
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3c9e5d71a2b4'
+down_revision: Union[str, None] = 'aaaf4ed0b3f5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_guest_table_user_id', 'guest_table', ['user_id'])
+    op.create_index('ix_guest_role_table_role_id', 'guest_role_table', ['role_id'])
+    op.create_index('ix_guest_role_table_guest_id', 'guest_role_table', ['guest_id'])
+    op.create_index('ix_role_table_name', 'role_table', ['name'])
+    op.create_index('ix_user_table_password_reset_hash', 'user_table', ['password_reset_hash'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_user_table_password_reset_hash', table_name='user_table')
+    op.drop_index('ix_role_table_name', table_name='role_table')
+    op.drop_index('ix_guest_role_table_guest_id', table_name='guest_role_table')
+    op.drop_index('ix_guest_role_table_role_id', table_name='guest_role_table')
+    op.drop_index('ix_guest_table_user_id', table_name='guest_table')
@@ -0,0 +1,46 @@
+"""Feat: Add email outbox
+
+Revision ID: 8f14b2c6d0e7
+Revises: 3c9e5d71a2b4
+Create Date: 2026-10-18 14:03:52.107334
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8f14b2c6d0e7'
+down_revision: Union[str, None] = '3c9e5d71a2b4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'email_outbox',
+        sa.Column('id', sa.Integer, primary_key=True, autoincrement=True),
+        sa.Column('kind', sa.Enum('VERIFICATION', 'PASSWORD_RESET', 'CONTACT_MESSAGE',
+                                  name='emailkind'), nullable=False),
+        sa.Column('payload', sa.JSON, nullable=True),
+        sa.Column('status', sa.Enum('PENDING', 'SENDING', 'SENT', 'DEAD',
+                                    name='outboxstatus'), nullable=False),
+        sa.Column('attempts', sa.Integer, nullable=False),
+        sa.Column('next_attempt_at', sa.DateTime, nullable=False),
+        sa.Column('claim_id', sa.String, nullable=True),
+        sa.Column('claimed_at', sa.DateTime, nullable=True),
+        sa.Column('sent_at', sa.DateTime, nullable=True),
+        sa.Column('last_error', sa.String, nullable=True),
+        sa.Column('created_at', sa.DateTime, nullable=False),
+    )
+    op.create_index('ix_email_outbox_status_next_attempt_at', 'email_outbox',
+                    ['status', 'next_attempt_at'])
+    op.create_index('ix_email_outbox_claim_id', 'email_outbox', ['claim_id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_email_outbox_claim_id', table_name='email_outbox')
+    op.drop_index('ix_email_outbox_status_next_attempt_at', table_name='email_outbox')
+    op.drop_table('email_outbox')
@@ -0,0 +1,35 @@
+"""Feat: Add guest and roster revisions for ETags
+
+Revision ID: b7d2e94f1c30
+Revises: 8f14b2c6d0e7
+Create Date: 2026-10-18 15:41:07.226913
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7d2e94f1c30'
+down_revision: Union[str, None] = '8f14b2c6d0e7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('revision_table',
+                    sa.Column('name', sa.String(), nullable=False),
+                    sa.Column('value', sa.Integer(), nullable=False),
+                    sa.PrimaryKeyConstraint('name')
+                    )
+    with op.batch_alter_table('user_table') as batch_op:
+        batch_op.add_column(sa.Column('guests_revision', sa.Integer(), nullable=False,
+                                      server_default='0'))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('user_table') as batch_op:
+        batch_op.drop_column('guests_revision')
+    op.drop_table('revision_table')
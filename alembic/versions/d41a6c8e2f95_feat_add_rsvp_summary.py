@@ -0,0 +1,44 @@
+"""Feat: Add RSVP summary
+
+Revision ID: d41a6c8e2f95
+Revises: b7d2e94f1c30
+Create Date: 2026-10-18 17:02:51.418306
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd41a6c8e2f95'
+down_revision: Union[str, None] = 'b7d2e94f1c30'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+OPTIONS = {
+    'status': ['UNDEFINED', 'REGISTERED', 'EXCUSED'],
+    'food_option': ['UNDEFINED', 'VEGETARIAN', 'OMNIVOR'],
+    'dessert_option': ['UNDEFINED', 'CHEESE', 'SWEET'],
+}
+
+
+def upgrade() -> None:
+    op.create_table('rsvp_summary_table',
+                    sa.Column('category', sa.String(), nullable=False),
+                    sa.Column('value', sa.String(), nullable=False),
+                    sa.Column('count', sa.Integer(), nullable=False),
+                    sa.PrimaryKeyConstraint('category', 'value')
+                    )
+    # Count the existing guests, every option needs a row to be counted incrementally
+    for category, values in OPTIONS.items():
+        for value in values:
+            op.execute(sa.text('INSERT INTO rsvp_summary_table (category, value, count) '
+                               'SELECT :category, :value, count(*) FROM guest_table '
+                               f'WHERE {category} = :value')
+                       .bindparams(category=category, value=value))
+
+
+def downgrade() -> None:
+    op.drop_table('rsvp_summary_table')
@@ -0,0 +1,50 @@
+""" Email template rendering with a new Jinja2 environment per email and with the registry
+
+Usage (from the repository root):
+    python -m benchmarks.bench_email_templates --iterations 2000
+"""
+import argparse
+import timeit
+
+from jinja2 import Environment, FileSystemLoader
+
+from src.email_sender import TEMPLATE_DIR, EMAIL_TEMPLATES, TemplateRegistry
+
+TEMPLATE_DATA = {
+    'base_url': 'http://localhost:4200',
+    'email_token': '0123456789abcdef',
+    'password_token': '0123456789abcdef',
+    'subject': 'A simple question',
+    'message': 'I have a question about your website',
+    'sender_email': 'example@test.org',
+    'sender_phone': '001 234 567 89',
+    'guest_count': 2,
+    'greeting': 'Liebe Ava, Lieber Juan',
+}
+
+
+def render_uncached(name: str) -> str:
+    # What _send_email did before the registry
+    env = Environment(loader=FileSystemLoader(TEMPLATE_DIR))
+    return env.get_template(name).render(TEMPLATE_DATA)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark email template rendering.')
+    parser.add_argument('--iterations', type=int, default=2000)
+    args = parser.parse_args()
+
+    registry = TemplateRegistry(TEMPLATE_DIR, EMAIL_TEMPLATES)
+
+    for name in EMAIL_TEMPLATES:
+        before = timeit.timeit(lambda: render_uncached(name), number=args.iterations)
+        after = timeit.timeit(lambda: registry.get(name).render(TEMPLATE_DATA),
+                              number=args.iterations)
+
+        print(f'{name:>38}: {before / args.iterations * 1e6:8.1f} us before, '
+              f'{after / args.iterations * 1e6:8.1f} us after '
+              f'({before / after:.0f}x)')
+
+
+if __name__ == '__main__':
+    main()
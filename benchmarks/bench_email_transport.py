@@ -0,0 +1,43 @@
+""" Email delivery through the memory and spool transports, without a mail server
+
+Usage (from the repository root):
+    python -m benchmarks.bench_email_transport --emails 2000
+"""
+import os
+import argparse
+import tempfile
+import time
+
+os.environ.setdefault('APP_ENV', 'testing')
+
+from src.email_sender import create_verification_email  # noqa: E402
+from src.email_transport import EmailTransport, MemoryTransport, SpoolTransport  # noqa: E402
+
+
+def run(transport: EmailTransport, emails: int) -> float:
+    start = time.perf_counter()
+    for i in range(emails):
+        transport.send(create_verification_email(f'guest{i}@mail.com', f'token{i}'))
+    transport.close()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the email transports.')
+    parser.add_argument('--emails', type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as spool_1, tempfile.TemporaryDirectory() as spool_20:
+        transports = {
+            'memory': MemoryTransport(),
+            'spool, fsync every email': SpoolTransport(spool_1, fsync_batch=1),
+            'spool, fsync batches of 20': SpoolTransport(spool_20, fsync_batch=20),
+        }
+
+        for name, transport in transports.items():
+            duration = run(transport, args.emails)
+            print(f'{name:>28}: {args.emails / duration:8.0f} emails/s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+""" CPU time per GET /guest-info request for families of 1, 10 and 100 guests
+
+Also compares building and serializing the GuestListDto with validation, as the route did
+before, and with model_construct and orjson.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_guest_info --requests 200
+"""
+import os
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+import pathlib
+
+os.environ.setdefault('APP_ENV', 'testing')
+
+import orjson  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+from src.config.app_config import Config  # noqa: E402
+from src.business_logic.services import Service  # noqa: E402
+from src.database.db import (  # noqa: E402
+    init_db,
+    dispose_db,
+    init_async_db,
+    dispose_async_db,
+    get_session_factory,
+)
+from src.database.db_base import Base  # noqa: E402
+from src.database.db_tables import User, Guest, Role  # noqa: E402
+from src.database.models.user_status import UserStatus  # noqa: E402
+from src.database.models.guest_status import GuestStatus  # noqa: E402
+from src.database.models.guest_role import GuestRole  # noqa: E402
+from src.database.models.food_options import FoodOption  # noqa: E402
+from src.database.models.dessert_options import DessertOption  # noqa: E402
+from src.routes.dto import GuestListDto  # noqa: E402
+from src.routes.responses import TrustedJSONResponse  # noqa: E402
+from src.routes.v1 import app_v1  # noqa: E402
+
+
+def _load_config(db_path: pathlib.Path) -> Config:
+    with open('./config/config_testing.json', 'r') as f:
+        data = json.load(f)
+
+    data['db'] = {'path': str(db_path.parent), 'filename': db_path.name}
+    return Config(**data)
+
+
+def _populate(config: Config, n_guests: int) -> str:
+    engine = init_db(config)
+    Base.metadata.create_all(engine)
+    asyncio.run(init_async_db(config))
+
+    email = f'family{n_guests}@bench.org'
+    session = get_session_factory()()
+    user = User(email=email, invitation_hash=email, status=UserStatus.VERIFIED)
+    for i in range(n_guests):
+        user.associated_guests.append(Guest(first_name=f'first{i}', last_name='last',
+                                            status=GuestStatus.REGISTERED,
+                                            food_option=FoodOption.VEGETARIAN,
+                                            dessert_option=DessertOption.SWEET,
+                                            allergies='Nuts', favorite_fairy_tale_character='',
+                                            favorite_tool='', roles=[Role(name=GuestRole.GUEST)]))
+    session.add(user)
+    session.commit()
+    session.close()
+    return email
+
+
+def _cpu_per_call(func, n: int) -> float:
+    func()
+    start = time.process_time()
+    for _ in range(n):
+        func()
+    return (time.process_time() - start) / n
+
+
+def run(n_guests: int, n_requests: int):
+    with tempfile.TemporaryDirectory() as temp_dir:
+        config = _load_config(pathlib.Path(temp_dir).joinpath('bench.sqlite'))
+        email = _populate(config, n_guests)
+
+        token = Service(db=None, config=config)._create_access_token(email)
+        client = TestClient(app=app_v1)
+        headers = {'Authorization': f'Bearer {token}'}
+
+        request = _cpu_per_call(lambda: client.get('/guest-info', headers=headers), n_requests)
+
+        session = get_session_factory()()
+        user_id = session.query(User.id).filter_by(email=email).scalar()
+        trusted_dto = Service(session, config).get_guests_by_user_id(user_id)
+        session.close()
+
+        payload = trusted_dto.model_dump()
+
+        def validated():
+            # Validated in the service and once more against the response model
+            dto = GuestListDto(**payload)
+            return GuestListDto.model_validate(dto.model_dump()).model_dump_json()
+
+        def trusted():
+            return TrustedJSONResponse(trusted_dto).body
+
+        assert orjson.loads(trusted()) == json.loads(validated())
+
+        asyncio.run(dispose_async_db())
+        dispose_db()
+
+    return request, _cpu_per_call(validated, n_requests), _cpu_per_call(trusted, n_requests)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark GET /guest-info.')
+    parser.add_argument('--requests', type=int, default=200)
+    args = parser.parse_args()
+
+    for n_guests in [1, 10, 100]:
+        request, validated, trusted = run(n_guests, args.requests)
+        print(f'{n_guests:>3} guests: {request * 1e3:6.2f} ms CPU per request, serialization '
+              f'{validated * 1e6:7.1f} us validated, {trusted * 1e6:7.1f} us trusted')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+""" Concurrent POST /guest-info throughput with SQLite's default and the tuned pragma profile
+
+Usage (from the repository root):
+    python -m benchmarks.bench_sqlite_profile --users 50 --requests 20 --workers 16
+"""
+import os
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+import pathlib
+from typing import List, Tuple
+
+os.environ.setdefault('APP_ENV', 'testing')
+
+import httpx  # noqa: E402
+
+from src.config.app_config import Config, SqliteSettings  # noqa: E402
+from src.business_logic.services import Service  # noqa: E402
+from src.database.db import (  # noqa: E402
+    init_db,
+    dispose_db,
+    init_async_db,
+    dispose_async_db,
+    get_session_factory,
+)
+from src.database.db_base import Base  # noqa: E402
+from src.database.db_tables import User, Guest, Role  # noqa: E402
+from src.database.models.user_status import UserStatus  # noqa: E402
+from src.database.models.guest_status import GuestStatus  # noqa: E402
+from src.database.models.guest_role import GuestRole  # noqa: E402
+from src.database.models.food_options import FoodOption  # noqa: E402
+from src.database.models.dessert_options import DessertOption  # noqa: E402
+from src.routes.v1 import app_v1  # noqa: E402
+
+# SQLite's built-in behaviour, i.e. what the app used before the tuning profile
+DEFAULT_PROFILE = SqliteSettings(journal_mode=None, synchronous=None, cache_size=None,
+                                 mmap_size=None, temp_store=None, busy_timeout=None)
+TUNED_PROFILE = SqliteSettings()
+
+
+def _load_config(db_path: pathlib.Path, profile: SqliteSettings) -> Config:
+    with open('./config/config_testing.json', 'r') as f:
+        data = json.load(f)
+
+    data['db'] = {'path': str(db_path.parent), 'filename': db_path.name,
+                  'pool_size': 32, 'sqlite': profile.model_dump()}
+    return Config(**data)
+
+
+def _populate(config: Config, n_users: int, n_guests: int):
+    engine = init_db(config)
+    Base.metadata.create_all(engine)
+
+    session = get_session_factory()()
+    for i in range(n_users):
+        user = User(email=f'user{i}@bench.org', invitation_hash=f'invitation{i}',
+                    status=UserStatus.VERIFIED)
+        for j in range(n_guests):
+            user.associated_guests.append(Guest(first_name=f'first{j}', last_name=f'last{i}',
+                                                status=GuestStatus.UNDEFINED,
+                                                food_option=FoodOption.UNDEFINED,
+                                                dessert_option=DessertOption.UNDEFINED,
+                                                allergies='', favorite_fairy_tale_character='',
+                                                favorite_tool='',
+                                                roles=[Role(name=GuestRole.GUEST)]))
+        session.add(user)
+    session.commit()
+
+    payloads = []
+    for user in session.query(User).order_by(User.id).all():
+        payloads.append((user.email, [{'id': guest.id, 'first_name': guest.first_name,
+                                       'last_name': guest.last_name, 'joins': True,
+                                       'food_option': FoodOption.VEGETARIAN.value,
+                                       'dessert_option': DessertOption.CHEESE.value,
+                                       'allergies': '', 'favorite_fairy_tale_character': '',
+                                       'favorite_tool': ''}
+                                      for guest in user.associated_guests]))
+    session.close()
+    return payloads
+
+
+async def _post_guests(config: Config, payloads: List, total: int,
+                       n_workers: int) -> Tuple[List[bool], float]:
+    # The pooled aiosqlite connections belong to one event loop, so the async engine is
+    # built on the loop serving all requests, with n_workers requests in flight at a time
+    await init_async_db(config)
+
+    service = Service(db=None, config=config)
+    workers = asyncio.Semaphore(n_workers)
+    transport = httpx.ASGITransport(app=app_v1)
+
+    async with httpx.AsyncClient(transport=transport, base_url='http://bench') as client:
+
+        async def post_guests(index: int) -> bool:
+            email, guests = payloads[index % len(payloads)]
+            token = service._create_access_token(email)
+            async with workers:
+                response = await client.post('/guest-info', json=guests,
+                                             headers={'Authorization': f'Bearer {token}'})
+            return response.status_code == 200
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*[post_guests(index) for index in range(total)])
+        elapsed = time.perf_counter() - start
+
+    await dispose_async_db()
+    return results, elapsed
+
+
+def run(profile: SqliteSettings, n_users: int, n_guests: int, n_requests: int, n_workers: int):
+    with tempfile.TemporaryDirectory() as temp_dir:
+        config = _load_config(pathlib.Path(temp_dir).joinpath('bench.sqlite'), profile)
+        payloads = _populate(config, n_users, n_guests)
+
+        total = n_users * n_requests
+        results, elapsed = asyncio.run(_post_guests(config, payloads, total, n_workers))
+
+        dispose_db()
+
+    return total, results.count(False), elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark SQLite pragma profiles.')
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--guests', type=int, default=3, help='Guests per user')
+    parser.add_argument('--requests', type=int, default=20, help='Requests per user')
+    parser.add_argument('--workers', type=int, default=16, help='Concurrent clients')
+    args = parser.parse_args()
+
+    for name, profile in [('default', DEFAULT_PROFILE), ('tuned', TUNED_PROFILE)]:
+        total, failed, elapsed = run(profile, args.users, args.guests,
+                                     args.requests, args.workers)
+        print(f'{name:>8}: {total} requests in {elapsed:.2f}s '
+              f'({total / elapsed:.1f} req/s, {failed} failed)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+import time
+import asyncio
+import threading
+from weakref import WeakKeyDictionary
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from pydantic import BaseModel, ConfigDict
+
+from src.metrics import REGISTRY, CallbackMetric
+
+
+class CachedContact(BaseModel):
+    """ Guest with an admin or witness role, who can be contacted through the website """
+    model_config = ConfigDict(frozen=True)
+
+    id: int
+    first_name: str
+    last_name: str
+    email: Optional[str]
+
+
+Contacts = Dict[int, CachedContact]
+
+
+class ContactCache:
+    """ Process-wide cache of the contacts by guest id
+
+    The roster changes only with the setup and registrations, which invalidate the cache.
+    Entries expire after ttl seconds as a safety net, e.g. for a setup run by another process.
+    On a miss only one caller loads the contacts, concurrent callers wait for its result.
+
+    Callers on an event loop use get_async: a load through AsyncSession.run_sync suspends on
+    the loop thread, where waiting for a thread lock would block the whole loop.
+    """
+
+    def __init__(self, ttl: float = 300.0) -> None:
+        self.ttl = ttl
+
+        self._entry: Optional[Tuple[float, Contacts]] = None
+        self._generation = 0
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        # asyncio locks belong to one event loop
+        self._async_load_locks: 'WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Lock]' \
+            = WeakKeyDictionary()
+
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+
+    def configure(self, ttl: float):
+        self.ttl = ttl
+        self.invalidate()
+
+    def _get_valid(self) -> Optional[Contacts]:
+        entry = self._entry
+        if entry is None or entry[0] < time.monotonic():
+            return None
+        return entry[1]
+
+    def get(self, load: Callable[[], Contacts]) -> Contacts:
+        contacts = self._get_valid()
+        if contacts is not None:
+            self.hits += 1
+            return contacts
+
+        self.misses += 1
+        with self._load_lock:
+            # Loaded by another caller while waiting
+            contacts = self._get_valid()
+            if contacts is not None:
+                return contacts
+
+            generation = self._generation
+            contacts = load()
+            self._store(generation, contacts)
+            return contacts
+
+    async def get_async(self, load: Callable[[], Awaitable[Contacts]]) -> Contacts:
+        contacts = self._get_valid()
+        if contacts is not None:
+            self.hits += 1
+            return contacts
+
+        self.misses += 1
+        async with self._get_async_load_lock():
+            # Loaded by another caller while waiting
+            contacts = self._get_valid()
+            if contacts is not None:
+                return contacts
+
+            generation = self._generation
+            contacts = await load()
+            self._store(generation, contacts)
+            return contacts
+
+    def _get_async_load_lock(self) -> asyncio.Lock:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            lock = self._async_load_locks.get(loop)
+            if lock is None:
+                lock = self._async_load_locks[loop] = asyncio.Lock()
+            return lock
+
+    def _store(self, generation: int, contacts: Contacts):
+        self.loads += 1
+
+        with self._lock:
+            # Not stored if invalidated during the load, the result might be outdated
+            if generation == self._generation:
+                self._entry = (time.monotonic() + self.ttl, contacts)
+
+    def invalidate(self):
+        with self._lock:
+            self._generation += 1
+            self._entry = None
+
+    def get_stats(self) -> Dict[str, int]:
+        return {'hits': self.hits, 'misses': self.misses, 'loads': self.loads}
+
+
+contact_cache = ContactCache()
+
+REGISTRY.register(CallbackMetric('contact_cache_hits_total', 'Contact cache hits', 'counter',
+                                 lambda: contact_cache.hits))
+REGISTRY.register(CallbackMetric('contact_cache_misses_total', 'Contact cache misses', 'counter',
+                                 lambda: contact_cache.misses))
+REGISTRY.register(CallbackMetric('contact_cache_loads_total', 'Contact list queries', 'counter',
+                                 lambda: contact_cache.loads))
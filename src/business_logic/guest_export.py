@@ -0,0 +1,76 @@
+import io
+import csv
+from enum import Enum
+from typing import AsyncIterator, Callable, Literal
+
+import orjson
+from sqlalchemy import String, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.database.db_tables import Guest, Role, User, guest_role_table
+
+ExportFormat = Literal['csv', 'ndjson']
+
+EXPORT_COLUMNS = ['guest_id', 'first_name', 'last_name', 'status', 'food_option',
+                  'dessert_option', 'allergies', 'favorite_fairy_tale_character',
+                  'favorite_tool', 'roles', 'user_id', 'email', 'user_status']
+
+
+def _get_export_query():
+    # One row per guest, roles are aggregated so rows can be streamed without regrouping
+    return select(Guest.id.label('guest_id'), Guest.first_name, Guest.last_name, Guest.status,
+                  Guest.food_option, Guest.dessert_option, Guest.allergies,
+                  Guest.favorite_fairy_tale_character, Guest.favorite_tool,
+                  func.group_concat(Role.name, ' ', type_=String).label('roles'),
+                  User.id.label('user_id'), User.email, User.status.label('user_status'))\
+        .outerjoin(Guest.user)\
+        .outerjoin(guest_role_table, guest_role_table.c.guest_id == Guest.id)\
+        .outerjoin(Role, Role.id == guest_role_table.c.role_id)\
+        .group_by(Guest.id).order_by(Guest.id)
+
+
+# Spreadsheets run cells starting with these as formulas
+_FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def _to_value(value):
+    return value.name if isinstance(value, Enum) else value
+
+
+def _to_csv_value(value):
+    # Guests write free text, a leading ' makes spreadsheets show it as text
+    value = _to_value(value)
+    if isinstance(value, str) and value.startswith(_FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+async def stream_guest_export(session_factory: Callable[[], AsyncSession],
+                              export_format: ExportFormat,
+                              batch_size: int = 500) -> AsyncIterator[bytes]:
+    """ Streams all guests with their user and answers as CSV or NDJSON
+
+    Rows are fetched batch_size at a time from a server-side cursor, so memory does not
+    grow with the number of guests. The session is opened here instead of using the one
+    of the request, which is closed before a streamed body is sent.
+    """
+    async with session_factory() as db:
+        result = await db.stream(_get_export_query().execution_options(yield_per=batch_size))
+
+        if export_format == 'csv':
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+
+            writer.writerow(EXPORT_COLUMNS)
+            yield buffer.getvalue().encode()
+
+            async for rows in result.partitions():
+                buffer.seek(0)
+                buffer.truncate()
+                writer.writerows([_to_csv_value(value) for value in row] for row in rows)
+                yield buffer.getvalue().encode()
+        else:
+            async for rows in result.partitions():
+                yield b''.join(orjson.dumps({column: _to_value(value) for column, value
+                                             in zip(EXPORT_COLUMNS, row)}) + b'\n'
+                               for row in rows)
@@ -0,0 +1,53 @@
+from typing import Iterable, Optional
+
+from sqlalchemy import select, update
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from src.database.db_tables import Guest, Revision, User
+
+
+ROSTER = 'roster'
+
+
+def bump_roster_revision(db: Session):
+    """ Marks a change of the guest list, e.g. by the setup. Stored with the next commit """
+    statement = insert(Revision).values(name=ROSTER, value=1)
+    db.execute(statement.on_conflict_do_update(index_elements=[Revision.name],
+                                               set_={'value': Revision.value + 1}))
+
+
+def bump_guests_revision(db: Session, guest_ids: Iterable[int]):
+    """ Marks a change of the guests of the users associated with the given guests """
+    user_ids = select(Guest.user_id).where(Guest.id.in_(list(guest_ids)))
+    db.execute(update(User).where(User.id.in_(user_ids.scalar_subquery()))
+               .values(guests_revision=User.guests_revision + 1)
+               .execution_options(synchronize_session=False))
+
+
+def _roster_revision():
+    return select(Revision.value).where(Revision.name == ROSTER).scalar_subquery()
+
+
+async def get_roster_etag(db: AsyncSession) -> str:
+    roster = await db.scalar(select(_roster_revision()))
+    return f'"c{roster or 0}"'
+
+
+async def get_guests_etag(db: AsyncSession, user_id: int) -> str:
+    """ Changes with the guests of the user and with the roster, which a new setup replaces """
+    row = (await db.execute(select(User.guests_revision, _roster_revision())
+                            .where(User.id == user_id))).one_or_none()
+    guests, roster = row if row is not None else (0, 0)
+    return f'"g{user_id}.{guests}.{roster or 0}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """ Weak comparison of If-None-Match, as required for GET requests """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+
+    return any(tag.strip().removeprefix('W/') == etag for tag in if_none_match.split(','))
@@ -0,0 +1,142 @@
+import asyncio
+import threading
+from enum import Enum
+from itertools import count
+from typing import AsyncIterator, Dict, List, Optional
+
+import orjson
+
+from src.metrics import REGISTRY, CallbackMetric
+
+
+class Subscription:
+    """ Bounded queue of encoded events for one subscriber, consumed on its event loop """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, max_size: int) -> None:
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_size)
+        self.dropped = False
+
+    async def get(self) -> Optional[bytes]:
+        """ Next encoded event, None if the subscriber fell behind and was dropped """
+        return await self.queue.get()
+
+
+class RsvpEventBroker:
+    """ In-process publish/subscribe of registrations and RSVP changes
+
+    Services publish after commit, from any thread. Each event is encoded once as a
+    Server-Sent Event and put into the bounded queue of every subscriber. A subscriber
+    whose queue is full is dropped instead of blocking the publisher or buffering without
+    limit; its stream ends and the client reconnects and reloads.
+    """
+
+    def __init__(self, queue_size: int = 100) -> None:
+        self.queue_size = queue_size
+
+        self._subscriptions: List[Subscription] = []
+        self._lock = threading.Lock()
+        self._ids = count(1)
+
+        self.published = 0
+        self.dropped = 0
+
+    def configure(self, queue_size: int):
+        self.queue_size = queue_size
+
+    def subscribe(self) -> Subscription:
+        """ Subscribes the running event loop to all following events """
+        subscription = Subscription(asyncio.get_running_loop(), self.queue_size)
+        with self._lock:
+            self._subscriptions.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            if subscription in self._subscriptions:
+                self._subscriptions.remove(subscription)
+
+    def get_subscriber_count(self) -> int:
+        return len(self._subscriptions)
+
+    def publish(self, event: str, data: Dict):
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        if not subscriptions:
+            return
+
+        self.published += 1
+        message = (f'id: {next(self._ids)}\nevent: {event}\ndata: '.encode()
+                   + orjson.dumps(_to_names(data)) + b'\n\n')
+
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(self._deliver, subscription, message)
+            except RuntimeError:
+                # The loop of the subscriber is closed
+                self.unsubscribe(subscription)
+
+    def _deliver(self, subscription: Subscription, message: bytes):
+        # Runs on the loop of the subscriber, which owns the queue
+        if subscription.dropped:
+            return
+        try:
+            subscription.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            subscription.dropped = True
+            self.dropped += 1
+            self.unsubscribe(subscription)
+
+            # Pending events are discarded, None wakes up the consumer to close the stream
+            while not subscription.queue.empty():
+                subscription.queue.get_nowait()
+            subscription.queue.put_nowait(None)
+
+
+def _to_names(value):
+    # orjson writes enums by value, the stream shows option names like the export
+    if isinstance(value, Enum):
+        return value.name
+    if isinstance(value, dict):
+        return {key: _to_names(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_to_names(item) for item in value]
+    return value
+
+
+async def stream_events(broker: RsvpEventBroker,
+                        heartbeat_interval: float) -> AsyncIterator[bytes]:
+    """ Subscribes to the broker and yields the events as Server-Sent Events
+
+    The subscription starts with the iteration and ends with it, a stream that is never
+    iterated, e.g. for a client that disconnected before, never subscribes.
+    A comment is sent after heartbeat_interval seconds without events, so proxies keep the
+    connection open and disconnected clients are noticed.
+    """
+    subscription = broker.subscribe()
+    try:
+        yield b': connected\n\n'
+        while True:
+            try:
+                message = await asyncio.wait_for(subscription.get(), heartbeat_interval)
+            except asyncio.TimeoutError:
+                yield b': heartbeat\n\n'
+                continue
+
+            if message is None:
+                yield b'event: dropped\ndata: {}\n\n'
+                return
+            yield message
+    finally:
+        broker.unsubscribe(subscription)
+
+
+rsvp_events = RsvpEventBroker()
+
+REGISTRY.register(CallbackMetric('rsvp_event_subscribers', 'Connected event stream subscribers',
+                                 'gauge', rsvp_events.get_subscriber_count))
+REGISTRY.register(CallbackMetric('rsvp_events_published_total', 'Published RSVP events',
+                                 'counter', lambda: rsvp_events.published))
+REGISTRY.register(CallbackMetric('rsvp_event_subscribers_dropped_total',
+                                 'Subscribers dropped for falling behind', 'counter',
+                                 lambda: rsvp_events.dropped))
@@ -0,0 +1,62 @@
+from typing import Dict, Iterable
+
+from sqlalchemy import and_, delete, func, insert, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from src.database.db_tables import Guest, RsvpSummary
+from src.database.models.guest_status import GuestStatus
+from src.database.models.food_options import FoodOption
+from src.database.models.dessert_options import DessertOption
+from src.routes.dto import RsvpSummaryDto
+
+# Summarized columns of the guest table and their options
+SUMMARY_CATEGORIES = {
+    'status': (Guest.status, GuestStatus),
+    'food_option': (Guest.food_option, FoodOption),
+    'dessert_option': (Guest.dessert_option, DessertOption),
+}
+
+
+def count_guests(db: Session, guest_ids: Iterable[int], sign: int):
+    """ Adds (sign=1) or removes (sign=-1) the given guests from the summary
+
+    Called with -1 before and with 1 after the guests are changed in the same transaction,
+    so the summary changes by the difference between old and new values. The counts are
+    read from the guest table within the writing statement, concurrent changes cannot
+    interleave.
+    """
+    guest_ids = list(guest_ids)
+    if not guest_ids:
+        return
+
+    matches = or_(*[and_(RsvpSummary.category == category, column == RsvpSummary.value)
+                    for category, (column, _) in SUMMARY_CATEGORIES.items()])
+    guests = select(func.count()).where(Guest.id.in_(guest_ids), matches).scalar_subquery()
+
+    db.execute(update(RsvpSummary).values(count=RsvpSummary.count + sign * guests)
+               .execution_options(synchronize_session=False))
+
+
+def rebuild_rsvp_summary(db: Session):
+    """ Recounts all guests, e.g. after the guest list was imported. Stored with the next commit """
+    # Sessions do not autoflush, guests added to it are counted as well
+    db.flush()
+    db.execute(delete(RsvpSummary))
+
+    for category, (column, options) in SUMMARY_CATEGORIES.items():
+        counts = dict(db.execute(select(column, func.count()).group_by(column)).all())
+        db.execute(insert(RsvpSummary), [{'category': category, 'value': option.name,
+                                          'count': counts.get(option, 0)}
+                                         for option in options])
+
+
+async def get_rsvp_summary(db: AsyncSession) -> RsvpSummaryDto:
+    """ Reads the totals from the summary, independent of the number of guests """
+    totals: Dict[str, Dict[str, int]] = {category: {} for category in SUMMARY_CATEGORIES}
+
+    for row in await db.execute(select(RsvpSummary.category, RsvpSummary.value,
+                                       RsvpSummary.count)):
+        totals.setdefault(row.category, {})[row.value] = row.count
+
+    return RsvpSummaryDto.model_construct(**totals)
@@ -1,14 +1,23 @@
 from datetime import datetime, timedelta
-from typing import List, Tuple
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
 import logging
-from sqlalchemy import and_
+from sqlalchemy import select, update
 from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.ext.asyncio import AsyncSession
 from jose import jwt
 
 from src.config.app_config import Config
+from src.business_logic.user_cache import CachedUser, user_cache
+from src.business_logic.contact_cache import CachedContact, Contacts, contact_cache
+from src.business_logic.revisions import bump_guests_revision
+from src.business_logic.rsvp_summary import count_guests
+from src.business_logic.rsvp_events import rsvp_events
+from src.email_outbox import enqueue_email
 from src.routes.dto import (
     RegistrationData,
     GuestDto,
+    GuestPatchDto,
     EmailVerificationDate,
     ContactInfoDTO,
     ContactListDto,
@@ -18,6 +27,7 @@ from src.routes.dto import (
     ResetPasswordRequestDto,
     GuestListDto,
     MessageDto,
+    Message,
 )
 from src.database.db_tables import User, Guest, Role
 from src.database.models.food_options import FoodOption
@@ -25,7 +35,21 @@ from src.database.models.dessert_options import DessertOption
 from src.database.models.guest_role import GuestRole
 from src.database.models.user_status import UserStatus
 from src.database.models.guest_status import GuestStatus
-from src.security import hash_token, generate_token, hash_password, verify_password
+from src.database.models.email_kind import EmailKind
+from src.security import (
+    hash_token,
+    generate_token,
+    hash_password,
+    hash_password_async,
+    verify_and_update_password,
+    verify_and_update_password_async,
+)
+
+
+# Columns read to build a GuestDto
+GUEST_DTO_COLUMNS = (Guest.id, Guest.first_name, Guest.last_name, Guest.status,
+                     Guest.food_option, Guest.dessert_option, Guest.allergies,
+                     Guest.favorite_fairy_tale_character, Guest.favorite_tool)
 
 
 class Service():
@@ -34,8 +58,12 @@ class Service():
         self.db = db
         self.config = config
 
-    def register_user(self, registration_data: RegistrationData) -> Tuple[User, str]:
+    def register_user(self, registration_data: RegistrationData,
+                      password_hash: Optional[str] = None) -> Tuple[User, str]:
+        user = self._get_registering_user(registration_data)
+        return self._complete_registration(user, registration_data, password_hash)
 
+    def _get_registering_user(self, registration_data: RegistrationData) -> User:
         hashed_token = hash_token(registration_data.invitation_token)
         user = self.db.query(User).filter_by(invitation_hash=hashed_token).first()
 
@@ -43,16 +71,28 @@ class Service():
         if not user or user.status not in {UserStatus.UNSEEN, UserStatus.UNVERIFIED}:
             raise AttributeError()
 
+        return user
+
+    def _complete_registration(self, user: User, registration_data: RegistrationData,
+                               password_hash: Optional[str]) -> Tuple[User, str]:
         try:
             email_token = generate_token()
+            previous_email = user.email
 
             user.email = registration_data.email
-            user.password_hash = hash_password(registration_data.password)
+            user.password_hash = password_hash or hash_password(registration_data.password)
             user.email_verification_hash = hash_token(email_token)
             user.status = UserStatus.UNVERIFIED
 
+            enqueue_email(self.db, EmailKind.VERIFICATION,
+                          receiver_email=user.email, verification_token=email_token)
+
             self.db.commit()
+            user_cache.invalidate(previous_email, user.email)
+            # The user might be a witness, whose contact email changed
+            contact_cache.invalidate()
             self.db.refresh(user)
+            rsvp_events.publish('registration', {'user_id': user.id})
             return user, email_token
         except Exception:
             self.db.rollback()
@@ -69,7 +109,9 @@ class Service():
 
             user.status = UserStatus.VERIFIED
             self.db.commit()
+            user_cache.invalidate(user.email)
             self.db.refresh(user)
+            rsvp_events.publish('email_verified', {'user_id': user.id})
 
             return LoginResponseDto(access_token=self._create_access_token(user.email))
         except Exception:
@@ -77,14 +119,29 @@ class Service():
             raise AttributeError()
 
     def login(self, email: str, password: str) -> LoginResponseDto:
+        user = self._get_login_user(email)
+        password_valid, new_password_hash = verify_and_update_password(password,
+                                                                       user.password_hash)
+        return self._complete_login(user, password_valid, new_password_hash)
+
+    def _get_login_user(self, email: str) -> User:
         user = self.db.query(User).filter_by(email=email).first()
 
         # Only verified user can login
         if not user or not user.email or user.status not in {UserStatus.VERIFIED}:
             raise AttributeError()
-        if not verify_password(password, user.password_hash):
+
+        return user
+
+    def _complete_login(self, user: User, password_valid: bool,
+                        new_password_hash: Optional[str]) -> LoginResponseDto:
+        if not password_valid:
             raise AttributeError()
 
+        # Stored hash uses another bcrypt cost than configured
+        if new_password_hash:
+            user.password_hash = new_password_hash
+
         user.last_login = datetime.now().isoformat()
         self.db.commit()
 
@@ -100,6 +157,9 @@ class Service():
             password_reset_token = generate_token()
             user.password_reset_hash = hash_token(password_reset_token)
 
+            enqueue_email(self.db, EmailKind.PASSWORD_RESET,
+                          email=user.email, password_token=password_reset_token)
+
             self.db.commit()
             self.db.refresh(user)
             return ForgetPasswordDto(email=user.email, password_token=password_reset_token)
@@ -107,110 +167,265 @@ class Service():
             self.db.rollback()
             return None
 
-    def reset_password(self, reset_password_dto: ResetPasswordRequestDto):
+    def reset_password(self, reset_password_dto: ResetPasswordRequestDto,
+                       password_hash: Optional[str] = None):
+        user = self._get_password_reset_user(reset_password_dto)
+        self._complete_password_reset(user, reset_password_dto, password_hash)
 
+    def _get_password_reset_user(self, reset_password_dto: ResetPasswordRequestDto) -> User:
         reset_password_hash = hash_token(reset_password_dto.token)
         user = self.db.query(User).filter_by(password_reset_hash=reset_password_hash).first()
 
         if not user:
             raise AttributeError()
 
+        return user
+
+    def _complete_password_reset(self, user: User, reset_password_dto: ResetPasswordRequestDto,
+                                 password_hash: Optional[str]):
         try:
-            user.password_hash = hash_password(reset_password_dto.password)
+            user.password_hash = password_hash or hash_password(reset_password_dto.password)
             user.password_reset_hash = None
 
             self.db.commit()
+            user_cache.invalidate(user.email)
         except Exception:
             self.db.rollback()
             raise AttributeError()
 
     def get_guests_of_user(self, user: User) -> GuestListDto:
-        guestList = GuestListDto()
-        for guest in user.associated_guests:
+        return self._get_guest_list(user.associated_guests)
+
+    def get_guests_by_user_id(self, user_id: int) -> GuestListDto:
+        # Only the columns of the DTO, rows are not turned into Guest objects
+        rows = self.db.execute(select(*GUEST_DTO_COLUMNS)
+                               .where(Guest.user_id == user_id).order_by(Guest.id)).all()
+        return self._get_guest_list(rows)
+
+    def _get_guest_list(self, guests: Iterable[Guest]) -> GuestListDto:
+        # Values read from the database are trusted, model_construct skips the validation
+        guest_dtos = []
+        for guest in guests:
             status = not (guest.status == GuestStatus.EXCUSED)
 
-            guestList.guests\
-                .append(GuestDto(id=guest.id, first_name=guest.first_name,
-                                 roles=[role.name.value for role in guest.roles],
-                                 last_name=guest.last_name, joins=status,
-                                 food_option=guest.food_option.value,
-                                 dessert_option=guest.dessert_option.value,
-                                 allergies=guest.allergies,
-                                 favorite_fairy_tale_character=guest.favorite_fairy_tale_character,
-                                 favorite_tool=guest.favorite_tool))
-        return guestList
+            guest_dtos.append(GuestDto.model_construct(
+                id=guest.id, first_name=guest.first_name,
+                last_name=guest.last_name, joins=status,
+                food_option=guest.food_option.value,
+                dessert_option=guest.dessert_option.value,
+                allergies=guest.allergies,
+                favorite_fairy_tale_character=guest.favorite_fairy_tale_character,
+                favorite_tool=guest.favorite_tool))
+        return GuestListDto.model_construct(guests=guest_dtos)
 
     def update_guests_of_user(self, guest_dtos: List[GuestDto], user: User) -> int:
-        """ Updates preferences of
+        """ Updates preferences of the guests associated with a user
 
-        Guest roles are not updated
+        Guest roles are not updated. All guests are validated first and then written
+        with a single executemany UPDATE. The RSVP summary is updated in the same transaction.
 
         Args:
-            guest_dtos (List[GuestDto]): _description_
-            user (User): _description_
+            guest_dtos (List[GuestDto]): Updated guests
+            user (User): Logged in user, with associated guests loaded
 
         Raises:
-            AttributeError: _description_
-            AttributeError: _description_
+            AttributeError: If a guest is not associated with the user
+            AttributeError: If an option is invalid or the update fails
+
+        Returns:
+            int: Number of updated guests
+        """
+        guests = {associated_guest.id: associated_guest
+                  for associated_guest in user.associated_guests}
+        return self.update_guests(guest_dtos, allowed_ids=guests.keys(), loaded_guests=guests)
+
+    def update_guests(self, guest_dtos: List[GuestDto], allowed_ids: Iterable[int],
+                      loaded_guests: Optional[Dict[int, Guest]] = None) -> int:
+        """ Updates preferences of guests, see update_guests_of_user
+
+        Args:
+            guest_dtos (List[GuestDto]): Updated guests
+            allowed_ids (Iterable[int]): Ids of the guests associated with the logged in user
+            loaded_guests (Optional[Dict[int, Guest]]): Loaded guests to keep in sync by id
 
         Returns:
-            int: _description_
+            int: Number of updated guests
         """
         # Check if only guest associated with the logged in user are changed
-        allowed_ids = set(associated_guest.id for associated_guest in user.associated_guests)
         received_ids = set(guest.id for guest in guest_dtos)
 
-        if received_ids - allowed_ids:
+        if received_ids - set(allowed_ids):
             raise AttributeError()
 
         try:
-            no_of_guests = 0
-            for guest_dto in guest_dtos:
-                guest = self.db.query(Guest).filter_by(id=guest_dto.id).first()
-
-                guest.status = GuestStatus.REGISTERED if guest_dto.joins else GuestStatus.EXCUSED
+            values = [{'id': guest_dto.id,
+                       'status': GuestStatus.REGISTERED if guest_dto.joins else GuestStatus.EXCUSED,
+                       'food_option': FoodOption(guest_dto.food_option),
+                       'dessert_option': DessertOption(guest_dto.dessert_option),
+                       'allergies': guest_dto.allergies,
+                       'favorite_fairy_tale_character': guest_dto.favorite_fairy_tale_character,
+                       'favorite_tool': guest_dto.favorite_tool} for guest_dto in guest_dtos]
+        except ValueError as e:
+            logging.error(f'Invalid guest options {guest_dtos}. {e}')
+            raise AttributeError()
 
-                guest.food_option = FoodOption(guest_dto.food_option)
-                guest.dessert_option = DessertOption(guest_dto.dessert_option)
-                guest.allergies = guest_dto.allergies
-                guest.favorite_fairy_tale_character = guest_dto.favorite_fairy_tale_character
-                guest.favorite_tool = guest_dto.favorite_tool
-                no_of_guests += 1
+        if not values:
+            return 0
 
+        try:
+            # The summary is corrected by the difference between old and new answers
+            count_guests(self.db, received_ids, -1)
+            self.db.execute(update(Guest), values)
+            count_guests(self.db, received_ids, 1)
+            bump_guests_revision(self.db, received_ids)
             self.db.commit()
-            return no_of_guests
         except Exception as e:
             logging.error(f'Failed to register user {guest_dtos}. {e}')
             self.db.rollback()
             raise AttributeError()
 
+        rsvp_events.publish('guests_updated', {'guests': values})
+
+        # Keep the loaded guests in sync without marking them dirty again
+        for guest_values in values:
+            guest = (loaded_guests or {}).get(guest_values['id'])
+            if guest is None:
+                continue
+            for key, value in guest_values.items():
+                set_committed_value(guest, key, value)
+
+        return len(values)
+
+    def patch_guests(self, guest_patches: List[GuestPatchDto], allowed_ids: Iterable[int]) -> int:
+        """ Updates only the given fields of guests, see update_guests_of_user
+
+        The fields are compared with the stored guests and only changed columns are written.
+        Without changes nothing is written and committed.
+
+        Args:
+            guest_patches (List[GuestPatchDto]): Changed fields by guest
+            allowed_ids (Iterable[int]): Ids of the guests associated with the logged in user
+
+        Raises:
+            AttributeError: If a guest is not associated with the user
+            AttributeError: If an option is invalid or the update fails
+
+        Returns:
+            int: Number of changed guests
+        """
+        received_ids = set(patch.id for patch in guest_patches)
+
+        if received_ids - set(allowed_ids):
+            raise AttributeError()
+
+        try:
+            patches = {}
+            for patch in guest_patches:
+                patches.setdefault(patch.id, {}).update(self._to_guest_columns(patch))
+        except ValueError as e:
+            logging.error(f'Invalid guest options {guest_patches}. {e}')
+            raise AttributeError()
+
+        values = self._get_changed_columns(patches)
+        if not values:
+            return 0
+
+        changed_ids = [guest_values['id'] for guest_values in values]
+        summary_ids = [guest_values['id'] for guest_values in values
+                       if guest_values.keys() & {'status', 'food_option', 'dessert_option'}]
+
+        try:
+            # Guests are grouped by their changed columns, one executemany UPDATE per group
+            count_guests(self.db, summary_ids, -1)
+            self.db.execute(update(Guest), values)
+            count_guests(self.db, summary_ids, 1)
+            bump_guests_revision(self.db, changed_ids)
+            self.db.commit()
+        except Exception as e:
+            logging.error(f'Failed to update guests {guest_patches}. {e}')
+            self.db.rollback()
+            raise AttributeError()
+
+        rsvp_events.publish('guests_updated', {'guests': values})
+
+        return len(values)
+
+    def _get_changed_columns(self, patches: Dict[int, Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """ Compares the patches with the stored guests
+
+        Returns:
+            List[Dict[str, Any]]: Id and changed columns of each changed guest
+        """
+        columns = {column for fields in patches.values() for column in fields}
+        if not columns:
+            return []
+
+        current = self.db.execute(select(Guest.id, *[getattr(Guest, column) for column in columns])
+                                  .where(Guest.id.in_(patches.keys())))
+
+        values = []
+        for row in current:
+            changed = {column: value for column, value in patches[row.id].items()
+                       if getattr(row, column) != value}
+            if changed:
+                values.append({'id': row.id, **changed})
+        return values
+
+    @staticmethod
+    def _to_guest_columns(patch: GuestPatchDto) -> Dict[str, Any]:
+        """ Converts the given fields of a patch to guest columns
+
+        Raises:
+            ValueError: If an option is invalid
+        """
+        fields = patch.model_dump(exclude={'id'}, exclude_none=True)
+        if 'joins' in fields:
+            joins = fields.pop('joins')
+            fields['status'] = GuestStatus.REGISTERED if joins else GuestStatus.EXCUSED
+        if 'food_option' in fields:
+            fields['food_option'] = FoodOption(fields['food_option'])
+        if 'dessert_option' in fields:
+            fields['dessert_option'] = DessertOption(fields['dessert_option'])
+        return fields
+
     def get_contact_info(self) -> ContactListDto:
-        target_roles = [GuestRole.ADMIN, GuestRole.WITNESS]
-        guests = self.db.query(Guest)\
-            .join(Role.guest).join(User)\
-            .filter(Role.name.in_(target_roles), and_(User.email is not None))\
-            .order_by(Guest.id).all()
+        return self._to_contact_list(contact_cache.get(self._load_contacts))
 
-        contacts = [ContactInfoDTO(id=g.id,
-                                   first_name=g.first_name,
-                                   last_name=g.last_name) for g in guests]
-        return ContactListDto(contacts=contacts)
+    @staticmethod
+    def _to_contact_list(contacts: Contacts) -> ContactListDto:
+        return ContactListDto.model_construct(contacts=[
+            ContactInfoDTO.model_construct(id=c.id, first_name=c.first_name, last_name=c.last_name)
+            for c in contacts.values()])
 
-    def send_message(self, message: MessageDto):
+    def _load_contacts(self) -> Contacts:
         target_roles = [GuestRole.ADMIN, GuestRole.WITNESS]
-        has_admin_role = self.db.query(Guest) \
-            .join(Role.guest).filter(Role.name.in_(target_roles),
-                                     and_(Guest.id == message.receiver_id)).first()
+        rows = self.db.execute(select(Guest.id, Guest.first_name, Guest.last_name, User.email)
+                               .join(Guest.roles).join(Guest.user)
+                               .where(Role.name.in_(target_roles))
+                               .distinct().order_by(Guest.id)).all()
+
+        return {row.id: CachedContact(id=row.id, first_name=row.first_name,
+                                      last_name=row.last_name, email=row.email)
+                for row in rows}
+
+    def send_message(self, message: MessageDto, contacts: Optional[Contacts] = None):
+        if contacts is None:
+            contacts = contact_cache.get(self._load_contacts)
+        contact = contacts.get(message.receiver_id)
+
+        # Only admins and witnesses with a registered email can be contacted
+        if contact is None or contact.email is None:
+            raise AttributeError()
 
-        if has_admin_role:
-            user = self.db.query(User)\
-                .join(Guest.user).filter(Guest.id == message.receiver_id,
-                                         User.email is not None).first()
+        m = Message(subject=message.subject, message=message.message,
+                    sender_email=message.sender_email,
+                    sender_phone=message.sender_phone)
 
-        if not user:
-            raise AttributeError()
+        enqueue_email(self.db, EmailKind.CONTACT_MESSAGE,
+                      receiver_email=contact.email, message=m.model_dump())
+        self.db.commit()
 
-        return {'email': user.email}
+        return {'email': contact.email}
 
     def _create_access_token(self, email: str) -> str:
         data = {'sub': email}
@@ -221,3 +436,66 @@ class Service():
                                  key=self.config.api.secret_key,
                                  algorithm=self.config.api.algorithm)
         return encoded_jwt
+
+
+class AsyncService():
+    """ Asyncio variant of Service used by the API routes
+
+    Every call runs the business logic of Service through AsyncSession.run_sync, so the
+    database I/O is awaited and the event loop keeps serving other requests meanwhile.
+    Passwords are hashed and verified in the password hashing pool beforehand.
+    """
+
+    def __init__(self, db: AsyncSession, config: Config) -> None:
+        self.db = db
+        self.config = config
+
+    async def _run(self, method: Callable, *args, **kwargs):
+        return await self.db.run_sync(
+            lambda session: method(Service(session, self.config), *args, **kwargs))
+
+    async def register_user(self, registration_data: RegistrationData) -> Tuple[User, str]:
+        # The token is checked first, invalid requests do not occupy the hashing pool
+        user = await self._run(Service._get_registering_user, registration_data)
+        password_hash = await hash_password_async(registration_data.password)
+        return await self._run(Service._complete_registration, user, registration_data,
+                               password_hash)
+
+    async def verify_email(self, email_verification: EmailVerificationDate) -> LoginResponseDto:
+        return await self._run(Service.verify_email, email_verification)
+
+    async def login(self, email: str, password: str) -> LoginResponseDto:
+        user = await self._run(Service._get_login_user, email)
+        password_valid, new_password_hash = \
+            await verify_and_update_password_async(password, user.password_hash)
+        return await self._run(Service._complete_login, user, password_valid, new_password_hash)
+
+    async def forget_password(self, forget_password_dto: ForgetPasswordRequestDto):
+        return await self._run(Service.forget_password, forget_password_dto)
+
+    async def reset_password(self, reset_password_dto: ResetPasswordRequestDto):
+        user = await self._run(Service._get_password_reset_user, reset_password_dto)
+        password_hash = await hash_password_async(reset_password_dto.password)
+        return await self._run(Service._complete_password_reset, user, reset_password_dto,
+                               password_hash)
+
+    async def get_guests_of_user(self, user: CachedUser) -> GuestListDto:
+        return await self._run(Service.get_guests_by_user_id, user.id)
+
+    async def update_guests_of_user(self, guest_dtos: List[GuestDto], user: CachedUser) -> int:
+        return await self._run(Service.update_guests, guest_dtos, user.guest_ids)
+
+    async def patch_guests_of_user(self, guest_patches: List[GuestPatchDto],
+                                   user: CachedUser) -> int:
+        return await self._run(Service.patch_guests, guest_patches, user.guest_ids)
+
+    async def _get_contacts(self) -> Contacts:
+        # Single-flight on the event loop, see ContactCache
+        return await contact_cache.get_async(lambda: self._run(Service._load_contacts))
+
+    async def get_contact_info(self) -> ContactListDto:
+        return Service._to_contact_list(await self._get_contacts())
+
+    async def send_message(self, message: MessageDto):
+        contacts = await self._get_contacts()
+        return await self._run(Service.send_message, message, contacts)
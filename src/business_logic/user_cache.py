@@ -0,0 +1,101 @@
+import time
+import threading
+from collections import OrderedDict
+from typing import Dict, FrozenSet, Optional, Tuple
+
+from pydantic import BaseModel, ConfigDict
+
+from src.database.db_tables import User
+from src.metrics import REGISTRY, CallbackMetric
+from src.database.models.user_status import UserStatus
+from src.database.models.guest_role import GuestRole
+
+
+class CachedUser(BaseModel):
+    """ Identity of an authenticated user, detached from any database session """
+    model_config = ConfigDict(frozen=True)
+
+    id: int
+    email: str
+    status: UserStatus
+    guest_ids: FrozenSet[int]
+    # Roles of all associated guests
+    roles: FrozenSet[GuestRole] = frozenset()
+
+    @classmethod
+    def from_user(cls, user: User) -> 'CachedUser':
+        return cls(id=user.id, email=user.email, status=user.status,
+                   guest_ids=frozenset(guest.id for guest in user.associated_guests),
+                   roles=frozenset(role.name for guest in user.associated_guests
+                                   for role in guest.roles))
+
+
+class UserCache:
+    """ LRU cache of authenticated users keyed by the token subject (email)
+
+    Entries expire after ttl seconds as a safety net. Service methods changing the status,
+    email or password of a user invalidate its entry explicitly. The cache is per process.
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: float = 60.0) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+
+        self._entries: OrderedDict[str, Tuple[float, CachedUser]] = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def configure(self, max_size: int, ttl: float):
+        with self._lock:
+            self.max_size = max_size
+            self.ttl = ttl
+            self._entries.clear()
+
+    def get(self, email: str) -> Optional[CachedUser]:
+        with self._lock:
+            entry = self._entries.get(email)
+
+            if entry is None or entry[0] < time.monotonic():
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(email)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, user: CachedUser):
+        with self._lock:
+            self._entries[user.email] = (time.monotonic() + self.ttl, user)
+            self._entries.move_to_end(user.email)
+
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, *emails: Optional[str]):
+        with self._lock:
+            for email in emails:
+                self._entries.pop(email, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> Dict[str, int]:
+        return {'hits': self.hits, 'misses': self.misses,
+                'evictions': self.evictions, 'size': len(self._entries)}
+
+
+user_cache = UserCache()
+
+REGISTRY.register(CallbackMetric('user_cache_hits_total', 'User cache hits', 'counter',
+                                 lambda: user_cache.hits))
+REGISTRY.register(CallbackMetric('user_cache_misses_total', 'User cache misses', 'counter',
+                                 lambda: user_cache.misses))
+REGISTRY.register(CallbackMetric('user_cache_evictions_total', 'User cache evictions', 'counter',
+                                 lambda: user_cache.evictions))
+REGISTRY.register(CallbackMetric('user_cache_size', 'Users in the cache', 'gauge',
+                                 lambda: len(user_cache._entries)))
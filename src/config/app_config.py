@@ -2,8 +2,11 @@ import os
 import pathlib
 import json
 import logging
+import threading
+import time
+from typing import Dict, Literal, Optional
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from pydantic_settings import BaseSettings
 
 
@@ -29,36 +32,184 @@ class EmailSettings(BaseModel):
     smtp_username: str
     smtp_password: str
 
+    # Pooled SMTP connections, shared by all emails sent by the process
+    smtp_pool_size: int = 2
+    smtp_timeout: float = 30
+    smtp_noop_interval: float = 30  # Idle seconds after which a connection is checked
+    smtp_max_connection_age: float = 300
+    smtp_max_messages_per_connection: int = 100
+
+    # Recompile changed email templates, meant for development
+    template_auto_reload: bool = False
+
+    # smtp sends to the server, memory keeps the last memory_max_messages emails and spool
+    # writes them as .eml files into the Maildir spool_path, e.g. for load tests without a
+    # mail server
+    transport: Literal['smtp', 'memory', 'spool'] = 'smtp'
+    memory_max_messages: int = 1000
+    spool_path: pathlib.Path = pathlib.Path('./data/output/mail_spool')
+    spool_fsync_batch: int = 20  # Spooled emails are fsynced together in batches of this size
+
 
 class ApiSettings(BaseModel):
     secret_key: str
     algorithm: str
     access_token_expire_minutes: int
 
+    # Authenticated users are cached per process, entries expire after ttl seconds
+    user_cache_size: int = 1024
+    user_cache_ttl: float = 60
+
+    # Contacts (admins and witnesses) are cached per process, invalidated on changes
+    contact_cache_ttl: float = 300
+
+    # Admin event stream, subscribers falling behind by more events are dropped
+    event_queue_size: int = 100
+    event_heartbeat_interval: float = 15
+
+    # GET /metrics requires this bearer token, None disables the endpoint
+    metrics_token: Optional[str] = None
+    # Seconds the email outbox counts of /metrics are reused before they are queried again
+    metrics_outbox_ttl: float = 15
+
+
+class OutboxSettings(BaseModel):
+    # Run the dispatcher inside the API process, disable when running `python -m src.email_outbox`
+    run_in_process: bool = True
+    poll_interval: float = 5  # Seconds between checks for due emails
+    batch_size: int = 20
+    max_attempts: int = 8  # Failed attempts before an email is dead-lettered
+    backoff_base: float = 30  # Seconds before the first retry, doubled with every attempt
+    backoff_max: float = 3600
+    claim_timeout: float = 300  # Seconds after which emails of a crashed dispatcher are retried
+
+
+class SecuritySettings(BaseModel):
+    # Cost of new password hashes, hashes with another cost are replaced on login
+    bcrypt_rounds: int = 12
+    # Threads hashing passwords and jobs allowed to wait for them before failing fast
+    hash_workers: int = 2
+    hash_queue_size: int = 8
+
+
+class ProfilerSettings(BaseModel):
+    """ Opt-in profiling of single requests, see src/routes/profiler.py """
+    enabled: bool = False
+    # Requests with this value in the X-Profile header are profiled, None disables the header
+    token: Optional[str] = None
+    sample_rate: float = 0.0  # Share of all requests profiled at random
+    sample_interval: float = 0.005  # Seconds between two stack samples
+    output_path: pathlib.Path = pathlib.Path('./data/output/profiles')
+    max_profiles: int = 50  # Older profiles are deleted
+
+
+class SqliteSettings(BaseModel):
+    """ Pragmas applied to every new SQLite connection, None keeps SQLite's default """
+    journal_mode: Optional[Literal['delete', 'truncate', 'persist', 'memory', 'wal', 'off']] = 'wal'
+    synchronous: Optional[Literal['off', 'normal', 'full', 'extra']] = 'normal'
+    cache_size: Optional[int] = -64000  # Negative values are KiB, i.e. 64 MB
+    mmap_size: Optional[int] = 268435456  # 256 MB
+    temp_store: Optional[Literal['default', 'file', 'memory']] = 'memory'
+    busy_timeout: Optional[int] = 5000  # Milliseconds
+
+    def get_pragmas(self) -> Dict[str, str]:
+        return {name: str(value) for name, value in self.model_dump().items()
+                if value is not None}
+
 
 class DatabaseSettings(BaseModel):
     path: pathlib.Path
     filename: str
 
+    # Connection pool of the process-wide engine
+    pool_size: int = 5
+    max_overflow: int = 10
+    pool_recycle: int = -1  # Seconds until a connection is replaced, -1 disables recycling
+    pool_pre_ping: bool = False
+
+    sqlite: SqliteSettings = Field(default_factory=SqliteSettings)
+
+    # Log every statement, expensive and only meant for debugging
+    echo: bool = False
+    # Statements taking longer are logged with redacted parameters
+    slow_query_threshold_ms: float = 100
+
     def get_file_path(self):
         return self.path.joinpath(self.filename).absolute()
 
+    def get_url(self) -> str:
+        return f'sqlite:///{self.get_file_path()}'
+
+    def get_async_url(self) -> str:
+        return f'sqlite+aiosqlite:///{self.get_file_path()}'
+
 
 class Config(BaseSettings):
     setup: Setup
     email: EmailSettings
     api: ApiSettings
     db: DatabaseSettings
+    security: SecuritySettings = Field(default_factory=SecuritySettings)
+    outbox: OutboxSettings = Field(default_factory=OutboxSettings)
+    profiler: ProfilerSettings = Field(default_factory=ProfilerSettings)
     frontend_base_url: str
 
+    # Watch the config file and reload it when it changes, e.g. for new SMTP credentials
+    auto_reload: bool = False
 
-def load_config(data=None):
 
-    if data is not None:
+class ConfigProvider:
+    """ Parses a config file once and hands out the cached Config
+
+    With auto_reload enabled in the file, its modification time is checked at most every
+    check_interval seconds and a changed file replaces the cached Config as a whole.
+    A file that fails to parse is logged and the previous Config is kept.
+    """
+
+    def __init__(self, file: pathlib.Path, check_interval: float = 1.0) -> None:
+        self.file = file
+        self.check_interval = check_interval
+
+        self._lock = threading.Lock()
+        self._mtime = self.file.stat().st_mtime
+        self._next_check = time.monotonic() + self.check_interval
+        self._config = self._parse()
+
+    def _parse(self) -> Config:
+        with open(file=self.file, mode='r') as f:
+            data = json.load(f)
         return Config(**data)
 
-    env = os.getenv("APP_ENV", "production")
+    def get(self) -> Config:
+        if self._config.auto_reload and time.monotonic() >= self._next_check:
+            self._reload_if_modified()
+        return self._config
+
+    def _reload_if_modified(self):
+        # Only one caller checks, the others keep using the current config meanwhile
+        if not self._lock.acquire(blocking=False):
+            return
+
+        try:
+            self._next_check = time.monotonic() + self.check_interval
+            mtime = self.file.stat().st_mtime
+            if mtime == self._mtime:
+                return
+
+            self._mtime = mtime
+            self._config = self._parse()
+            logging.info(f'Reloaded config {self.file}')
+        except Exception as e:
+            logging.error(f'Failed to reload config {self.file}, keeping previous config. {e}')
+        finally:
+            self._lock.release()
+
+
+_providers: Dict[str, ConfigProvider] = {}
+_providers_lock = threading.Lock()
 
+
+def _get_config_file(env: str) -> pathlib.Path:
     if env == 'production':
         logging.info(f'Using {env} config')
         file = pathlib.Path('/config/config.json')
@@ -72,7 +223,26 @@ def load_config(data=None):
     if not file.exists():
         raise FileNotFoundError(f'Could not find config: {file}')
 
-    with open(file=file, mode='r') as f:
-        data = json.load(f)
+    return file
+
+
+def load_config(data=None) -> Config:
+    """ Returns the config of the current APP_ENV
+
+    The file is parsed on first use and cached afterwards. Passing data builds a new
+    Config from it instead, without touching the cache.
+    """
+
+    if data is not None:
+        return Config(**data)
+
+    env = os.getenv("APP_ENV", "production")
+
+    provider = _providers.get(env)
+    if provider is None:
+        with _providers_lock:
+            provider = _providers.get(env)
+            if provider is None:
+                provider = _providers[env] = ConfigProvider(_get_config_file(env))
 
-    return Config(**data)
+    return provider.get()
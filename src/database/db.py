@@ -1,19 +1,156 @@
-from sqlalchemy import create_engine
+from typing import Optional
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
 
-from src.config.app_config import load_config
+from src.config.app_config import Config, SqliteSettings, load_config
+from src.database.instrumentation import instrument_engine
+
+
+# Process-wide engines and session factories
+# The async engine serves the API, the sync engine the setup scripts and tests
+_engine: Optional[Engine] = None
+_session_factory: Optional[sessionmaker] = None
+
+_async_engine: Optional[AsyncEngine] = None
+_async_session_factory: Optional[async_sessionmaker] = None
+
+
+def _set_sqlite_pragmas(settings: SqliteSettings):
+
+    pragmas = settings.get_pragmas()
+
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+        cursor.close()
+
+    return on_connect
+
+
+def create_db_engine(config: Config) -> Engine:
+    engine = create_engine(config.db.get_url(), echo=config.db.echo,
+                           pool_size=config.db.pool_size,
+                           max_overflow=config.db.max_overflow,
+                           pool_recycle=config.db.pool_recycle,
+                           pool_pre_ping=config.db.pool_pre_ping,
+                           connect_args={"check_same_thread": False})
+
+    event.listen(engine, 'connect', _set_sqlite_pragmas(config.db.sqlite))
+    instrument_engine(engine, config.db.slow_query_threshold_ms)
+
+    return engine
+
+
+def create_async_db_engine(config: Config) -> AsyncEngine:
+    engine = create_async_engine(config.db.get_async_url(), echo=config.db.echo,
+                                 pool_size=config.db.pool_size,
+                                 max_overflow=config.db.max_overflow,
+                                 pool_recycle=config.db.pool_recycle,
+                                 pool_pre_ping=config.db.pool_pre_ping)
+
+    event.listen(engine.sync_engine, 'connect', _set_sqlite_pragmas(config.db.sqlite))
+    instrument_engine(engine.sync_engine, config.db.slow_query_threshold_ms)
+
+    return engine
+
+
+def init_db(config: Optional[Config] = None) -> Engine:
+    """ Builds the process-wide engine and session factory
+
+    A previously initialized engine is disposed and replaced.
+
+    Args:
+        config (Optional[Config]): Config to use, loaded from file if not provided
+
+    Returns:
+        Engine: The new engine
+    """
+    global _engine, _session_factory
+
+    dispose_db()
+
+    if config is None:
+        config = load_config()
+
+    _engine = create_db_engine(config)
+    _session_factory = sessionmaker(autocommit=False, autoflush=False, bind=_engine)
+
+    return _engine
+
+
+def dispose_db():
+    """ Closes all pooled connections and forgets the process-wide engine """
+    global _engine, _session_factory
+
+    if _engine is not None:
+        _engine.dispose()
+
+    _engine = None
+    _session_factory = None
+
+
+def get_engine() -> Engine:
+    if _engine is None:
+        init_db()
+    return _engine
+
+
+def get_session_factory() -> sessionmaker:
+    if _session_factory is None:
+        init_db()
+    return _session_factory
+
+
+async def init_async_db(config: Optional[Config] = None) -> AsyncEngine:
+    """ Builds the process-wide async engine and session factory
+
+    A previously initialized async engine is disposed and replaced.
+
+    Args:
+        config (Optional[Config]): Config to use, loaded from file if not provided
+
+    Returns:
+        AsyncEngine: The new engine
+    """
+    global _async_engine, _async_session_factory
+
+    await dispose_async_db()
+
+    if config is None:
+        config = load_config()
+
+    _async_engine = create_async_db_engine(config)
+    # Objects stay loaded after commit, lazy refreshes would need a greenlet context
+    _async_session_factory = async_sessionmaker(bind=_async_engine, autoflush=False,
+                                                expire_on_commit=False)
+
+    return _async_engine
+
+
+async def dispose_async_db():
+    """ Closes all pooled connections and forgets the process-wide async engine """
+    global _async_engine, _async_session_factory
+
+    if _async_engine is not None:
+        await _async_engine.dispose()
+
+    _async_engine = None
+    _async_session_factory = None
 
 
-def get_db():
-    config = load_config()
+def get_async_session_factory() -> async_sessionmaker:
+    if _async_session_factory is None:
+        raise RuntimeError('Async database is not initialized, call init_async_db() first')
+    return _async_session_factory
 
-    engine = create_engine(f"sqlite:///{config.db.get_file_path()}",
-                           echo=True, connect_args={"check_same_thread": False})
 
-    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+async def get_db():
+    if _async_session_factory is None:
+        await init_async_db()
 
-    db = SessionLocal()
-    try:
+    async with get_async_session_factory()() as db:
         yield db
-    finally:
-        db.close()
@@ -1,4 +1,4 @@
-from sqlalchemy import Table, Column, ForeignKey, Enum, Integer, String
+from sqlalchemy import Table, Column, ForeignKey, Enum, Integer, String, DateTime, JSON, Index
 from sqlalchemy.orm import relationship, mapped_column
 
 from src.database.models.guest_status import GuestStatus
@@ -6,6 +6,8 @@ from src.database.models.user_status import UserStatus
 from src.database.models.guest_role import GuestRole
 from src.database.models.food_options import FoodOption
 from src.database.models.dessert_options import DessertOption
+from src.database.models.email_kind import EmailKind
+from src.database.models.outbox_status import OutboxStatus
 from src.database.db_base import Base
 
 
@@ -13,8 +15,8 @@ from src.database.db_base import Base
 guest_role_table = Table(
     'guest_role_table',
     Base.metadata,
-    Column('role_id', ForeignKey('role_table.id')),
-    Column('guest_id', ForeignKey('guest_table.id'))
+    Column('role_id', ForeignKey('role_table.id'), index=True),
+    Column('guest_id', ForeignKey('guest_table.id'), index=True)
 )
 
 
@@ -22,7 +24,7 @@ class Role(Base):
     __tablename__ = 'role_table'
 
     id = Column(Integer, primary_key=True, autoincrement=True)
-    name = Column(Enum(GuestRole))
+    name = Column(Enum(GuestRole), index=True)
 
     # m:n = Role:Guest
     guest = relationship('Guest', secondary=guest_role_table, back_populates='roles')
@@ -34,11 +36,13 @@ class User(Base):
     id = Column(Integer, primary_key=True, autoincrement=True)
     email = Column(String, unique=True, nullable=True)
     password_hash = Column(String, nullable=True)
-    password_reset_hash = Column(String, nullable=True)
+    password_reset_hash = Column(String, index=True, nullable=True)
     invitation_hash = Column(String, index=True, unique=True, nullable=False)
     email_verification_hash = Column(String, index=True, unique=True, nullable=True)
     last_login = Column(String, nullable=True)
     status = Column(Enum(UserStatus))
+    # Incremented with every change of the associated guests, used for ETags
+    guests_revision = Column(Integer, nullable=False, default=0, server_default='0')
     # Relationships
 
     # 1:n = User : Guest
@@ -60,10 +64,48 @@ class Guest(Base):
 
     # Relationship
 
-    user_id = mapped_column(ForeignKey('user_table.id'))
+    user_id = mapped_column(ForeignKey('user_table.id'), index=True)
 
     # n:1 = Guest:User
     user = relationship('User', back_populates='associated_guests')
 
     # m:n = User:Role
     roles = relationship('Role', secondary=guest_role_table, back_populates='guest')
+
+
+class EmailOutbox(Base):
+    __tablename__ = 'email_outbox'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    kind = Column(Enum(EmailKind), nullable=False)
+    payload = Column(JSON, nullable=True)  # Arguments of the email, cleared once sent
+    status = Column(Enum(OutboxStatus), nullable=False)
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, nullable=False)
+    claim_id = Column(String, nullable=True)
+    claimed_at = Column(DateTime, nullable=True)
+    sent_at = Column(DateTime, nullable=True)
+    last_error = Column(String, nullable=True)
+    created_at = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        Index('ix_email_outbox_status_next_attempt_at', 'status', 'next_attempt_at'),
+        Index('ix_email_outbox_claim_id', 'claim_id'),
+    )
+
+
+class Revision(Base):
+    """ Named counters incremented on changes, e.g. the roster revision """
+    __tablename__ = 'revision_table'
+
+    name = Column(String, primary_key=True)
+    value = Column(Integer, nullable=False, default=0)
+
+
+class RsvpSummary(Base):
+    """ Number of guests per status, food and dessert option, kept up to date on changes """
+    __tablename__ = 'rsvp_summary_table'
+
+    category = Column(String, primary_key=True)  # Column of the guest table, e.g. status
+    value = Column(String, primary_key=True)  # Name of the enum member
+    count = Column(Integer, nullable=False, default=0)
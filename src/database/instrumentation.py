@@ -0,0 +1,85 @@
+import time
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+logger = logging.getLogger(__name__)
+
+
+class QueryStats:
+    """ Number of queries and accumulated database time of one request """
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.duration = 0.0  # Seconds
+
+    def get_server_timing(self) -> str:
+        return f'db;dur={self.duration * 1000:.2f};desc="{self.count} queries"'
+
+
+QueryStatsSink = Callable[[str, QueryStats], None]
+
+_current_stats: ContextVar[Optional[QueryStats]] = ContextVar('query_stats', default=None)
+_sinks: List[QueryStatsSink] = []
+
+
+@contextmanager
+def track_queries():
+    """ Accumulates all queries executed within the current context into a QueryStats """
+    stats = QueryStats()
+    token = _current_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _current_stats.reset(token)
+
+
+def add_query_stats_sink(sink: QueryStatsSink):
+    """ Registers a callback receiving the route and the QueryStats of every request """
+    _sinks.append(sink)
+
+
+def remove_query_stats_sink(sink: QueryStatsSink):
+    _sinks.remove(sink)
+
+
+def report_query_stats(route: str, stats: QueryStats):
+    for sink in _sinks:
+        sink(route, stats)
+
+
+def _redact(parameters, executemany: bool) -> str:
+    if executemany:
+        return f'<{len(parameters)} parameter sets>'
+    if isinstance(parameters, dict):
+        return str({key: '?' for key in parameters})
+    return str(tuple('?' for _ in parameters or ()))
+
+
+def instrument_engine(engine: Engine, slow_query_threshold_ms: float):
+    """ Times every statement of the engine and logs the ones slower than the threshold
+
+    For async engines pass AsyncEngine.sync_engine.
+    """
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_start_time', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        duration = time.perf_counter() - conn.info['query_start_time'].pop()
+
+        stats = _current_stats.get()
+        if stats is not None:
+            stats.count += 1
+            stats.duration += duration
+
+        if duration * 1000 >= slow_query_threshold_ms:
+            logger.warning(f'Slow query ({duration * 1000:.1f} ms): {statement} '
+                           f'parameters: {_redact(parameters, executemany)}')
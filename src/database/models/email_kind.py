@@ -0,0 +1,7 @@
+from enum import Enum
+
+
+class EmailKind(Enum):
+    VERIFICATION = 1     # Email address verification after registration
+    PASSWORD_RESET = 2   # Link to reset a forgotten password
+    CONTACT_MESSAGE = 3  # Message sent through the contact form
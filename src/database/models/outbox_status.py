@@ -0,0 +1,8 @@
+from enum import Enum
+
+
+class OutboxStatus(Enum):
+    PENDING = 0  # Waiting to be sent, possibly after a failed attempt
+    SENDING = 1  # Claimed by a dispatcher
+    SENT = 2     # Accepted by the SMTP server
+    DEAD = 3     # Given up after too many failed attempts
@@ -0,0 +1,243 @@
+import signal
+import logging
+import argparse
+import threading
+from uuid import uuid4
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import and_, or_, select, update
+from sqlalchemy.orm import Session
+
+from src.config.app_config import Config, OutboxSettings, load_config
+from src.database.db import init_db, get_session_factory
+from src.database.db_tables import EmailOutbox
+from src.database.models.email_kind import EmailKind
+from src.database.models.outbox_status import OutboxStatus
+from src.metrics import EMAILS_SENT, EMAIL_SEND_FAILURES
+from src.email_sender import send_verification_email, send_password_reset_email, send_message_email
+from src.routes.dto import ForgetPasswordDto, Message
+
+
+def enqueue_email(db: Session, kind: EmailKind, **payload) -> EmailOutbox:
+    """ Adds an email to the outbox, it is stored with the next commit of the session """
+    now = datetime.utcnow()
+    email = EmailOutbox(kind=kind, payload=payload, status=OutboxStatus.PENDING, attempts=0,
+                        next_attempt_at=now, created_at=now)
+    db.add(email)
+    return email
+
+
+def _send_verification(payload: Dict):
+    send_verification_email(receiver_email=payload['receiver_email'],
+                            verification_token=payload['verification_token'])
+
+
+def _send_password_reset(payload: Dict):
+    send_password_reset_email(forget_password_dto=ForgetPasswordDto(**payload))
+
+
+def _send_contact_message(payload: Dict):
+    send_message_email(receiver_email=payload['receiver_email'],
+                       message=Message(**payload['message']))
+
+
+_senders: Dict[EmailKind, Callable[[Dict], None]] = {
+    EmailKind.VERIFICATION: _send_verification,
+    EmailKind.PASSWORD_RESET: _send_password_reset,
+    EmailKind.CONTACT_MESSAGE: _send_contact_message,
+}
+
+# Plaintext tokens, the user table only stores their hashes
+_token_fields = ('verification_token', 'password_token')
+
+
+def _without_tokens(payload: Optional[Dict]) -> Optional[Dict]:
+    if payload is None:
+        return None
+    return {key: None if key in _token_fields else value for key, value in payload.items()}
+
+
+class EmailDispatcher:
+    """ Sends the emails of the outbox
+
+    Due emails are claimed in batches, so several dispatchers can share one outbox.
+    Failed emails are retried with exponential backoff and dead-lettered after
+    max_attempts. Emails claimed by a crashed dispatcher are retried after claim_timeout.
+    The claim is renewed right before each email is sent and results are only written while
+    the claim is held, so claim_timeout has to exceed the time of a single send.
+    """
+
+    def __init__(self, settings: OutboxSettings,
+                 session_factory: Optional[Callable[[], Session]] = None) -> None:
+        self.settings = settings
+        self.session_factory = session_factory or get_session_factory()
+        self._wake = threading.Event()
+
+    def claim_batch(self, db: Session) -> List[EmailOutbox]:
+        now = datetime.utcnow()
+        claim_id = uuid4().hex
+
+        due = select(EmailOutbox.id).where(or_(
+            and_(EmailOutbox.status == OutboxStatus.PENDING, EmailOutbox.next_attempt_at <= now),
+            and_(EmailOutbox.status == OutboxStatus.SENDING,
+                 EmailOutbox.claimed_at < now - timedelta(seconds=self.settings.claim_timeout))
+        )).order_by(EmailOutbox.id).limit(self.settings.batch_size)
+
+        # A single statement, concurrent dispatchers never claim the same email
+        db.execute(update(EmailOutbox)
+                   .where(EmailOutbox.id.in_(due.scalar_subquery()))
+                   .values(status=OutboxStatus.SENDING, claim_id=claim_id, claimed_at=now)
+                   .execution_options(synchronize_session=False))
+        db.commit()
+
+        emails = db.query(EmailOutbox).filter_by(claim_id=claim_id).order_by(EmailOutbox.id).all()
+
+        # Detached, commits do not reload them with the claim of another dispatcher
+        for email in emails:
+            db.expunge(email)
+        return emails
+
+    def _update_claimed(self, db: Session, email: EmailOutbox, **values) -> bool:
+        """ Updates the email if it is still claimed by this dispatcher and commits """
+        result = db.execute(update(EmailOutbox)
+                            .where(EmailOutbox.id == email.id,
+                                   EmailOutbox.claim_id == email.claim_id,
+                                   EmailOutbox.status == OutboxStatus.SENDING)
+                            .values(**values)
+                            .execution_options(synchronize_session=False))
+        db.commit()
+        return result.rowcount == 1
+
+    def _send(self, db: Session, email: EmailOutbox):
+        # The claim timeout counts from here, not from the claim of the whole batch. Emails
+        # which waited too long in the batch may have been claimed by another dispatcher.
+        if not self._update_claimed(db, email, claimed_at=datetime.utcnow()):
+            logging.warning(f'Email {email.id} was claimed by another dispatcher, skipping it')
+            return
+
+        try:
+            _senders[email.kind](email.payload)
+        except Exception as e:
+            EMAIL_SEND_FAILURES.labels(email.kind.name).inc()
+            attempts = email.attempts + 1
+            values = {'attempts': attempts, 'last_error': str(e)[:500]}
+
+            if attempts >= self.settings.max_attempts:
+                values['status'] = OutboxStatus.DEAD
+                values['payload'] = _without_tokens(email.payload)
+                logging.error(f'Giving up email {email.id} after {attempts} attempts. {e}')
+            else:
+                delay = min(self.settings.backoff_base * 2 ** (attempts - 1),
+                            self.settings.backoff_max)
+                values['status'] = OutboxStatus.PENDING
+                values['next_attempt_at'] = datetime.utcnow() + timedelta(seconds=delay)
+                logging.warning(f'Failed to send email {email.id}, retry in {delay}s. {e}')
+        else:
+            EMAILS_SENT.labels(email.kind.name).inc()
+            # Tokens are not kept longer than needed
+            values = {'status': OutboxStatus.SENT, 'sent_at': datetime.utcnow(), 'payload': None}
+
+        if not self._update_claimed(db, email, claim_id=None, **values):
+            logging.warning(f'Email {email.id} was claimed by another dispatcher while sending')
+
+    def run_once(self, stop: Optional[threading.Event] = None) -> int:
+        """ Sends one batch of due emails
+
+        Once stop is set, the remaining emails of the batch are left claimed and are sent
+        again after claim_timeout, by this or another dispatcher.
+
+        Returns:
+            int: Number of processed emails
+        """
+        db = self.session_factory()
+        try:
+            emails = self.claim_batch(db)
+            for processed, email in enumerate(emails):
+                if stop is not None and stop.is_set():
+                    return processed
+                self._send(db, email)
+            return len(emails)
+        finally:
+            db.close()
+
+    def notify(self):
+        """ Wakes up run() to send newly added emails right away """
+        self._wake.set()
+
+    def run(self, stop: threading.Event):
+        while not stop.is_set():
+            self._wake.clear()
+            try:
+                processed = self.run_once(stop)
+            except Exception as e:
+                logging.error(f'Email dispatcher failed. {e}')
+                processed = 0
+
+            # Continue right away while full batches are due
+            if processed < self.settings.batch_size:
+                self._wake.wait(timeout=self.settings.poll_interval)
+
+
+_dispatcher: Optional[EmailDispatcher] = None
+_dispatcher_thread: Optional[threading.Thread] = None
+_dispatcher_stop = threading.Event()
+
+
+def start_email_dispatcher(config: Config):
+    """ Runs the dispatcher in a background thread of the current process """
+    global _dispatcher, _dispatcher_thread
+
+    _dispatcher = EmailDispatcher(config.outbox)
+    _dispatcher_stop.clear()
+    _dispatcher_thread = threading.Thread(target=_dispatcher.run, args=(_dispatcher_stop,),
+                                          name='email-dispatcher', daemon=True)
+    _dispatcher_thread.start()
+
+
+def stop_email_dispatcher():
+    global _dispatcher, _dispatcher_thread
+
+    _dispatcher_stop.set()
+    if _dispatcher is not None:
+        _dispatcher.notify()
+    if _dispatcher_thread is not None:
+        _dispatcher_thread.join()
+
+    _dispatcher = None
+    _dispatcher_thread = None
+
+
+def notify_email_dispatcher():
+    """ Wakes up the in-process dispatcher, if any, after emails were added """
+    if _dispatcher is not None:
+        _dispatcher.notify()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Send the emails of the outbox.')
+    parser.add_argument('--once', action='store_true', help='Send due emails and exit')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    config = load_config()
+    init_db(config)
+    dispatcher = EmailDispatcher(config.outbox)
+
+    if args.once:
+        while dispatcher.run_once() > 0:
+            pass
+        return
+
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: (stop.set(), dispatcher.notify()))
+
+    try:
+        dispatcher.run(stop)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
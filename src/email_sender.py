@@ -1,16 +1,65 @@
-import smtplib
-import ssl
-from typing import Dict, List, Tuple
+from typing import Dict, Iterable, List, Optional, Tuple
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from pathlib import Path
-from jinja2 import Environment, FileSystemLoader
+from jinja2 import Environment, FileSystemLoader, Template
 
 from src.config.app_config import load_config
+from src.email_transport import get_email_transport
 from src.routes.dto import Message, ForgetPasswordDto
 
 
-def send_password_reset_email(forget_password_dto: ForgetPasswordDto):
+SENDER_EMAIL = 'noreplay@molitoris.org'
+
+TEMPLATE_DIR = Path(__file__).parent.joinpath('static', 'html')
+
+EMAIL_TEMPLATES = (
+    'email_verification_template.html',
+    'email_password_reset.html',
+    'email_contact_message_template.html',
+    'email_reminder_template.html',
+)
+
+
+class TemplateRegistry:
+    """ Compiles the email templates once and hands out the compiled templates
+
+    With auto_reload, changed template files are recompiled on their next use.
+    """
+
+    def __init__(self, template_dir: Path, template_names: Iterable[str],
+                 auto_reload: bool = False) -> None:
+        self.auto_reload = auto_reload
+        self.env = Environment(loader=FileSystemLoader(template_dir), auto_reload=auto_reload)
+        self.templates: Dict[str, Template] = {}
+
+        # Raises TemplateNotFound or TemplateSyntaxError for missing or broken templates
+        for name in template_names:
+            self.templates[name] = self.env.get_template(name)
+
+    def get(self, name: str) -> Template:
+        if self.auto_reload:
+            return self.env.get_template(name)
+        return self.templates[name]
+
+
+_templates: Optional[TemplateRegistry] = None
+
+
+def load_email_templates(auto_reload: bool = False) -> TemplateRegistry:
+    """ Compiles all email templates, called at startup to fail early """
+    global _templates
+    _templates = TemplateRegistry(TEMPLATE_DIR, EMAIL_TEMPLATES, auto_reload=auto_reload)
+    return _templates
+
+
+def get_email_templates() -> TemplateRegistry:
+    if _templates is None:
+        return load_email_templates()
+    return _templates
+
+
+def create_password_reset_email(forget_password_dto: ForgetPasswordDto) -> MIMEMultipart:
     config = load_config()
 
     subject = "Hochzeit Melanie & Rafael - Passwort Reset"
@@ -22,14 +71,14 @@ def send_password_reset_email(forget_password_dto: ForgetPasswordDto):
 
     plain_text = f'{forget_password_dto.password_token}'
 
-    _send_email(receiver_email=forget_password_dto.email,
-                subject=subject,
-                plain_text=plain_text,
-                template_name=template_name,
-                template_data=template_data)
+    return _create_email(receiver_email=forget_password_dto.email,
+                         subject=subject,
+                         plain_text=plain_text,
+                         template_name=template_name,
+                         template_data=template_data)
 
 
-def send_message_email(receiver_email: str, message: Message):
+def create_message_email(receiver_email: str, message: Message) -> MIMEMultipart:
 
     subject = 'Hochzeit Melanie & Rafael - Kontakt'
     template_name = 'email_contact_message_template.html'
@@ -41,14 +90,14 @@ def send_message_email(receiver_email: str, message: Message):
     }
     plain_text = ''
 
-    _send_email(receiver_email=receiver_email,
-                subject=subject,
-                plain_text=plain_text,
-                template_name=template_name,
-                template_data=template_data)
+    return _create_email(receiver_email=receiver_email,
+                         subject=subject,
+                         plain_text=plain_text,
+                         template_name=template_name,
+                         template_data=template_data)
 
 
-def send_verification_email(receiver_email: str, verification_token: str):
+def create_verification_email(receiver_email: str, verification_token: str) -> MIMEMultipart:
 
     config = load_config()
 
@@ -59,14 +108,14 @@ def send_verification_email(receiver_email: str, verification_token: str):
         'email_token': verification_token
     }
 
-    _send_email(receiver_email=receiver_email,
-                subject=subject,
-                plain_text=f'{verification_token}',
-                template_name='email_verification_template.html',
-                template_data=template_data)
+    return _create_email(receiver_email=receiver_email,
+                         subject=subject,
+                         plain_text=f'{verification_token}',
+                         template_name='email_verification_template.html',
+                         template_data=template_data)
 
 
-def send_reminer_email(guests: List[Tuple[str, str]], receiver_email: str):
+def create_reminder_email(guests: List[Tuple[str, str]], receiver_email: str) -> MIMEMultipart:
 
     subject = 'Hochzeit Melanie & Rafael - Bald ist es soweit'
 
@@ -84,33 +133,62 @@ def send_reminer_email(guests: List[Tuple[str, str]], receiver_email: str):
         'greeting': greetings,
     }
 
-    _send_email(receiver_email=receiver_email,
-                subject=subject,
-                plain_text='',
-                template_name='email_reminder_template.html',
-                template_data=template_data)
+    return _create_email(receiver_email=receiver_email,
+                         subject=subject,
+                         plain_text='',
+                         template_name='email_reminder_template.html',
+                         template_data=template_data)
 
 
-def _send_email(receiver_email: str,
-                subject: str,
-                plain_text: str,
-                template_name: str,
-                template_data: Dict,
-                template_dir: Path = Path('./src/static/html')
-                ):
+def send_password_reset_email(forget_password_dto: ForgetPasswordDto):
+    _send_message(create_password_reset_email(forget_password_dto))
+
+
+def send_message_email(receiver_email: str, message: Message):
+    _send_message(create_message_email(receiver_email=receiver_email, message=message))
+
+
+def send_verification_email(receiver_email: str, verification_token: str):
+    _send_message(create_verification_email(receiver_email=receiver_email,
+                                            verification_token=verification_token))
+
+
+def send_reminer_email(guests: List[Tuple[str, str]], receiver_email: str):
+    _send_message(create_reminder_email(guests=guests, receiver_email=receiver_email))
+
+
+async def send_password_reset_email_async(forget_password_dto: ForgetPasswordDto):
+    await _send_message_async(create_password_reset_email(forget_password_dto))
+
+
+async def send_message_email_async(receiver_email: str, message: Message):
+    await _send_message_async(create_message_email(receiver_email=receiver_email,
+                                                   message=message))
 
-    config = load_config()
 
-    sender_email = 'noreplay@molitoris.org'
+async def send_verification_email_async(receiver_email: str, verification_token: str):
+    await _send_message_async(create_verification_email(receiver_email=receiver_email,
+                                                        verification_token=verification_token))
+
+
+async def send_reminer_email_async(guests: List[Tuple[str, str]], receiver_email: str):
+    await _send_message_async(create_reminder_email(guests=guests,
+                                                    receiver_email=receiver_email))
+
+
+def _create_email(receiver_email: str,
+                  subject: str,
+                  plain_text: str,
+                  template_name: str,
+                  template_data: Dict
+                  ) -> MIMEMultipart:
 
     message = MIMEMultipart('alternative')
     message['Subject'] = subject
-    message['From'] = sender_email
+    message['From'] = SENDER_EMAIL
     message['To'] = receiver_email
 
-    env = Environment(loader=FileSystemLoader(template_dir))
-
-    template = env.get_template(template_name)
+    template = get_email_templates().get(template_name)
 
     email_content = template.render(template_data)
 
@@ -119,14 +197,17 @@ def _send_email(receiver_email: str,
     message.attach(MIMEText(plain_text, 'plain'))
     message.attach(MIMEText(email_content, 'html'))
 
-    context = ssl.create_default_context()
-    with smtplib.SMTP(host=config.email.smtp_server, port=config.email.smtp_port) as server:
+    return message
+
 
-        # Running localhost does not require TLS
-        if config.email.smtp_server != 'localhost':
-            server.starttls(context=context)
-            server.login(user=config.email.smtp_username, password=config.email.smtp_password)
+def _send_message(message: MIMEMultipart):
+    config = load_config()
+
+    get_email_transport(config.email).send(message)
+
+
+async def _send_message_async(message: MIMEMultipart):
+    """ Sends without blocking a thread, e.g. over the SMTP pool of the running event loop """
+    config = load_config()
 
-        server.sendmail(from_addr=sender_email,
-                        to_addrs=receiver_email,
-                        msg=message.as_string())
+    await get_email_transport(config.email).send_async(message)
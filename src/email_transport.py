@@ -0,0 +1,173 @@
+import os
+import time
+import socket
+import asyncio
+import threading
+from abc import ABC, abstractmethod
+from pathlib import Path
+from collections import deque
+from email.message import Message
+from itertools import count
+from typing import Deque, Dict, List, Tuple
+
+from src.config.app_config import EmailSettings
+from src.smtp_pool import get_smtp_pool, get_async_smtp_pool
+
+
+class EmailTransport(ABC):
+    """ Delivers rendered emails, selected by EmailSettings.transport """
+
+    @abstractmethod
+    def send(self, message: Message):
+        pass
+
+    @abstractmethod
+    async def send_async(self, message: Message):
+        pass
+
+    def close(self):
+        pass
+
+
+class SmtpTransport(EmailTransport):
+
+    def __init__(self, settings: EmailSettings) -> None:
+        self.settings = settings
+
+    def send(self, message: Message):
+        get_smtp_pool(self.settings).send(from_addr=message['From'],
+                                          to_addrs=message['To'],
+                                          msg=message.as_string())
+
+    async def send_async(self, message: Message):
+        await get_async_smtp_pool(self.settings).send(from_addr=message['From'],
+                                                      to_addrs=message['To'],
+                                                      msg=message.as_string())
+
+
+class MemoryTransport(EmailTransport):
+    """ Keeps the last max_messages sent emails, older ones are dropped """
+
+    def __init__(self, max_messages: int = 1000) -> None:
+        self.messages: Deque[Message] = deque(maxlen=max(max_messages, 1))
+        self._lock = threading.Lock()
+
+    def send(self, message: Message):
+        with self._lock:
+            self.messages.append(message)
+
+    async def send_async(self, message: Message):
+        self.send(message)
+
+    def clear(self):
+        with self._lock:
+            self.messages.clear()
+
+
+class SpoolTransport(EmailTransport):
+    """ Writes the emails as .eml files into a Maildir
+
+    Each email is written to tmp/ and renamed into new/, so readers never see partial files.
+    To keep up with high rates, files are fsynced in batches of fsync_batch emails instead of
+    one by one. Emails of an unfinished batch may be lost on a crash, close() syncs them.
+    """
+
+    def __init__(self, path: Path, fsync_batch: int = 20) -> None:
+        self.path = Path(path)
+        self.fsync_batch = max(fsync_batch, 1)
+
+        for sub_dir in ('tmp', 'new', 'cur'):
+            self.path.joinpath(sub_dir).mkdir(parents=True, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._counter = count()
+        self._unsynced: List[Path] = []
+
+    def _get_filename(self) -> str:
+        # Maildir style unique name: time.pid_counter.host
+        return f'{time.time_ns()}.{os.getpid()}_{next(self._counter)}.{socket.gethostname()}.eml'
+
+    def send(self, message: Message):
+        filename = self._get_filename()
+        tmp_file = self.path.joinpath('tmp', filename)
+        new_file = self.path.joinpath('new', filename)
+
+        tmp_file.write_bytes(message.as_bytes())
+        os.replace(tmp_file, new_file)
+
+        with self._lock:
+            self._unsynced.append(new_file)
+            if len(self._unsynced) < self.fsync_batch:
+                return
+            files, self._unsynced = self._unsynced, []
+
+        self._fsync(files)
+
+    async def send_async(self, message: Message):
+        await asyncio.to_thread(self.send, message)
+
+    def _fsync(self, files: List[Path]):
+        for file in files:
+            fd = os.open(file, os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+        # Persist the renames as well
+        fd = os.open(self.path.joinpath('new'), os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def close(self):
+        with self._lock:
+            files, self._unsynced = self._unsynced, []
+
+        if files:
+            self._fsync(files)
+
+
+_transports: Dict[Tuple, EmailTransport] = {}
+_transports_lock = threading.Lock()
+
+
+def get_email_transport(settings: EmailSettings) -> EmailTransport:
+    """ Returns the shared transport configured by the settings
+
+    Transports of other settings are outdated, e.g. after a config reload, and are closed.
+    """
+    key = (settings.transport, settings.memory_max_messages,
+           settings.spool_path, settings.spool_fsync_batch,
+           settings.smtp_server, settings.smtp_port,
+           settings.smtp_username, settings.smtp_password)
+
+    with _transports_lock:
+        transport = _transports.get(key)
+        if transport is not None:
+            return transport
+
+        outdated = list(_transports.values())
+        _transports.clear()
+
+        if settings.transport == 'memory':
+            transport = MemoryTransport(settings.memory_max_messages)
+        elif settings.transport == 'spool':
+            transport = SpoolTransport(settings.spool_path, settings.spool_fsync_batch)
+        else:
+            transport = SmtpTransport(settings)
+        _transports[key] = transport
+
+    for outdated_transport in outdated:
+        outdated_transport.close()
+    return transport
+
+
+def close_email_transports():
+    with _transports_lock:
+        transports = list(_transports.values())
+        _transports.clear()
+
+    for transport in transports:
+        transport.close()
@@ -0,0 +1,223 @@
+""" Minimal Prometheus metrics, rendered in the text exposition format by GET /metrics
+
+Every labelled child holds its own lock, so recording only contends with a concurrent
+recording of the same child or a scrape. The registry lock is only taken to add children.
+"""
+import math
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ''
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+        pairs.append(f'{name}="{value}"')
+    return '{' + ','.join(pairs) + '}'
+
+
+class _Value:
+    __slots__ = ('value', 'lock')
+
+    def __init__(self) -> None:
+        self.value = 0.0
+        self.lock = threading.Lock()
+
+    def inc(self, amount: float = 1):
+        with self.lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1):
+        with self.lock:
+            self.value -= amount
+
+    def set(self, value: float):
+        self.value = value
+
+
+class _HistogramValue:
+    __slots__ = ('upper_bounds', 'counts', 'sum', 'lock')
+
+    def __init__(self, upper_bounds: Sequence[float]) -> None:
+        self.upper_bounds = upper_bounds
+        self.counts = [0] * (len(upper_bounds) + 1)  # Last one is +Inf
+        self.sum = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.upper_bounds, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    @contextmanager
+    def time(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+
+class _Metric:
+    type = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+
+        if not self.labelnames:
+            self._children[()] = self._new_child()
+
+    def _new_child(self):
+        return _Value()
+
+    def labels(self, *values: str):
+        key = tuple(str(value) for value in values)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _samples(self) -> Iterable[str]:
+        for key, child in list(self._children.items()):
+            yield f'{self.name}{_format_labels(self.labelnames, key)} ' \
+                  f'{_format_value(child.value)}'
+
+    def render(self) -> List[str]:
+        return [f'# HELP {self.name} {self.documentation}',
+                f'# TYPE {self.name} {self.type}',
+                *self._samples()]
+
+
+class Counter(_Metric):
+    type = 'counter'
+
+    def inc(self, amount: float = 1):
+        self._children[()].inc(amount)
+
+
+class Gauge(_Metric):
+    type = 'gauge'
+
+    def inc(self, amount: float = 1):
+        self._children[()].inc(amount)
+
+    def dec(self, amount: float = 1):
+        self._children[()].dec(amount)
+
+    def set(self, value: float):
+        self._children[()].set(value)
+
+
+class Histogram(_Metric):
+    type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS) -> None:
+        self.upper_bounds = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramValue(self.upper_bounds)
+
+    def observe(self, value: float):
+        self._children[()].observe(value)
+
+    def time(self):
+        return self._children[()].time()
+
+    def _samples(self) -> Iterable[str]:
+        names = self.labelnames + ('le',)
+        for key, child in list(self._children.items()):
+            with child.lock:
+                counts, total = list(child.counts), child.sum
+
+            cumulative = 0
+            for upper_bound, count in zip(self.upper_bounds + (math.inf,), counts):
+                cumulative += count
+                labels = _format_labels(names, key + (_format_value(upper_bound),))
+                yield f'{self.name}_bucket{labels} {cumulative}'
+
+            labels = _format_labels(self.labelnames, key)
+            yield f'{self.name}_sum{labels} {_format_value(total)}'
+            yield f'{self.name}_count{labels} {cumulative}'
+
+
+class CallbackMetric(_Metric):
+    """ Metric whose value is read at scrape time, e.g. from the statistics of a cache """
+
+    def __init__(self, name: str, documentation: str, type: str,
+                 callback: Callable[[], float]) -> None:
+        super().__init__(name, documentation)
+        self.type = type
+        self.callback = callback
+
+    def _samples(self) -> Iterable[str]:
+        yield f'{self.name} {_format_value(self.callback())}'
+
+
+class MetricsRegistry:
+
+    def __init__(self) -> None:
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines += metric.render()
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+HTTP_REQUESTS = REGISTRY.register(Counter(
+    'http_requests_total', 'Handled HTTP requests', ['route', 'method', 'status']))
+HTTP_REQUESTS_IN_FLIGHT = REGISTRY.register(Gauge(
+    'http_requests_in_flight', 'HTTP requests currently handled'))
+HTTP_REQUEST_DURATION = REGISTRY.register(Histogram(
+    'http_request_duration_seconds', 'Latency of HTTP requests', ['route', 'method']))
+
+DB_QUERIES = REGISTRY.register(Counter(
+    'db_queries_total', 'Database queries executed by requests', ['route']))
+DB_QUERY_SECONDS = REGISTRY.register(Counter(
+    'db_query_seconds_total', 'Database time spent by requests', ['route']))
+
+PASSWORD_HASHING_SECONDS = REGISTRY.register(Histogram(
+    'password_hashing_seconds', 'Time spent hashing or verifying passwords with bcrypt',
+    ['operation'], buckets=(0.05, 0.1, 0.2, 0.3, 0.5, 1, 2)))
+PASSWORD_HASHING_REJECTED = REGISTRY.register(Counter(
+    'password_hashing_rejected_total', 'Requests rejected because the hash pool was full'))
+
+EMAIL_OUTBOX = REGISTRY.register(Gauge(
+    'email_outbox_emails', 'Emails in the outbox, updated by scrapes', ['status']))
+EMAILS_SENT = REGISTRY.register(Counter(
+    'emails_sent_total', 'Emails sent by the outbox dispatcher', ['kind']))
+EMAIL_SEND_FAILURES = REGISTRY.register(Counter(
+    'email_send_failures_total', 'Failed attempts to send an email', ['kind']))
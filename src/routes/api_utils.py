@@ -2,22 +2,34 @@ from typing import Annotated
 
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.orm import selectinload
+from sqlalchemy.ext.asyncio import AsyncSession
 from jose import JWTError, jwt
-from src.business_logic.services import Service
+from src.business_logic.services import AsyncService
+from src.business_logic.user_cache import CachedUser, user_cache
 
-from src.config.app_config import load_config
+from src.config.app_config import Config, load_config
 from src.database.db import get_db
-from src.database.db_tables import User
+from src.database.db_tables import User, Guest
 from src.database.models.user_status import UserStatus
+from src.database.models.guest_role import GuestRole
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
-config = load_config()
+# Guests and their roles are read by most authenticated routes, loading them eagerly
+# costs two additional queries in total instead of one per guest
+current_user_load_options = selectinload(User.associated_guests).selectinload(Guest.roles)
+
+
+def get_config() -> Config:
+    # Cached by load_config, reloaded there if the file changed
+    return load_config()
 
 
 async def get_current_user(token: Annotated[str, Depends(oauth2_scheme)],
-                           db: Session = Depends(get_db)):
+                           db: AsyncSession = Depends(get_db),
+                           config: Config = Depends(get_config)):
     credentials_exception = HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
                                           detail='Could not validate credentials',
                                           headers={'WWW-Authenticate': 'Bearer'})
@@ -30,18 +42,34 @@ async def get_current_user(token: Annotated[str, Depends(oauth2_scheme)],
     except JWTError:
         raise credentials_exception
 
-    user = db.query(User).filter_by(email=email).first()
-    if user is None:
+    user = user_cache.get(email)
+    if user is not None:
+        return user
+
+    result = await db.execute(select(User).filter_by(email=email)
+                              .options(current_user_load_options))
+    db_user = result.scalars().first()
+    if db_user is None:
         raise credentials_exception
 
+    user = CachedUser.from_user(db_user)
+    user_cache.put(user)
     return user
 
 
-async def get_current_active_user(current_user: Annotated[User, Depends(get_current_user)]):
+async def get_current_active_user(current_user: Annotated[CachedUser,
+                                                          Depends(get_current_user)]):
     if current_user.status not in {UserStatus.VERIFIED}:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='Inactive user')
     return current_user
 
 
-def get_serivce(db: Session = Depends(get_db)):
-    yield Service(db, config)
+async def get_current_admin_user(current_user: Annotated[CachedUser,
+                                                         Depends(get_current_active_user)]):
+    if GuestRole.ADMIN not in current_user.roles:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail='Admins only')
+    return current_user
+
+
+def get_serivce(db: AsyncSession = Depends(get_db), config: Config = Depends(get_config)):
+    yield AsyncService(db, config)
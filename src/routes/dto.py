@@ -1,4 +1,4 @@
-from typing import List
+from typing import Dict, List, Optional
 from pydantic import BaseModel, Field
 
 
@@ -48,6 +48,17 @@ class GuestDto(BaseModel):
     favorite_tool: str
 
 
+class GuestPatchDto(BaseModel):
+    # Only fields which are set are updated, names cannot be changed
+    id: int
+    joins: Optional[bool] = None
+    food_option: Optional[int] = None
+    dessert_option: Optional[int] = None
+    allergies: Optional[str] = None
+    favorite_fairy_tale_character: Optional[str] = None
+    favorite_tool: Optional[str] = None
+
+
 class GuestListDto(BaseModel):
     guests: List[GuestDto] = Field(default_factory=list)
 
@@ -75,3 +86,10 @@ class Message(BaseModel):
     message: str
     sender_email: str
     sender_phone: str
+
+
+class RsvpSummaryDto(BaseModel):
+    # Number of guests by option name, e.g. {'REGISTERED': 20, 'EXCUSED': 3, ...}
+    status: Dict[str, int] = Field(default_factory=dict)
+    food_option: Dict[str, int] = Field(default_factory=dict)
+    dessert_option: Dict[str, int] = Field(default_factory=dict)
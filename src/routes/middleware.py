@@ -0,0 +1,110 @@
+import time
+
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.database.instrumentation import QueryStats, track_queries, report_query_stats
+from src.metrics import (
+    DB_QUERIES,
+    DB_QUERY_SECONDS,
+    HTTP_REQUESTS,
+    HTTP_REQUESTS_IN_FLIGHT,
+    HTTP_REQUEST_DURATION,
+)
+
+
+def get_route_path(scope: Scope) -> str:
+    """ Returns the route template (e.g. /guest-info) or unmatched if no route matched
+
+    Raw paths are never returned, they would let clients create any number of label values.
+    """
+    return getattr(scope.get('route'), 'path', 'unmatched')
+
+
+_METHODS = frozenset({'GET', 'POST', 'PUT', 'PATCH', 'DELETE', 'HEAD', 'OPTIONS'})
+
+
+def get_method(scope: Scope) -> str:
+    """ Returns the request method, or other for methods outside the standard ones
+
+    Any token is accepted as method, so clients could create any number of label values.
+    """
+    method = scope['method']
+    return method if method in _METHODS else 'other'
+
+
+class QueryStatsMiddleware:
+    """ Reports query count and database time of each request
+
+    The numbers are added as Server-Timing header and passed to the query stats sinks.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        with track_queries() as stats:
+
+            async def send_with_server_timing(message: Message):
+                if message['type'] == 'http.response.start':
+                    headers = MutableHeaders(scope=message)
+                    headers.append('Server-Timing', stats.get_server_timing())
+                await send(message)
+
+            await self.app(scope, receive, send_with_server_timing)
+
+        report_query_stats(get_route_path(scope), stats)
+
+
+def record_query_metrics(route: str, stats: QueryStats):
+    """ Query stats sink adding the database work of a request to the metrics """
+    DB_QUERIES.labels(route).inc(stats.count)
+    DB_QUERY_SECONDS.labels(route).inc(stats.duration)
+
+
+class MetricsMiddleware:
+    """ Records count, status, latency and in-flight requests per route template
+
+    Paths without a matching route are recorded as one route, unmatched, and unknown
+    methods as other, to keep the number of label values bounded. Event streams are
+    counted, but neither kept in flight after they started nor added to the latency, as
+    they last as long as the client stays.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+        in_flight = True
+
+        async def send_with_status(message: Message):
+            nonlocal status_code, in_flight
+            if message['type'] == 'http.response.start':
+                status_code = message['status']
+                content_type = MutableHeaders(scope=message).get('content-type', '')
+                if content_type.startswith('text/event-stream'):
+                    in_flight = False
+                    HTTP_REQUESTS_IN_FLIGHT.dec()
+            await send(message)
+
+        HTTP_REQUESTS_IN_FLIGHT.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            duration = time.perf_counter() - start
+
+            route, method = get_route_path(scope), get_method(scope)
+            HTTP_REQUESTS.labels(route, method, status_code).inc()
+            if in_flight:
+                HTTP_REQUESTS_IN_FLIGHT.dec()
+                HTTP_REQUEST_DURATION.labels(route, method).observe(duration)
@@ -0,0 +1,138 @@
+import re
+import sys
+import time
+import random
+import asyncio
+import cProfile
+import secrets
+import threading
+from collections import Counter
+from datetime import datetime
+from itertools import count
+from pathlib import Path
+
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.config.app_config import ProfilerSettings
+
+
+def _collapse(frame) -> str:
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f'{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})')
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class StackSampler:
+    """ Samples the stack of one thread from a background thread
+
+    The result is in the collapsed stack format read by flame graph tools.
+    """
+
+    def __init__(self, thread_id: int, interval: float) -> None:
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter = Counter()
+
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[_collapse(frame)] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def get_collapsed(self) -> str:
+        return ''.join(f'{stack} {samples}\n' for stack, samples in self.stacks.most_common())
+
+
+class ProfilerMiddleware:
+    """ Profiles requests selected by the X-Profile header or at random
+
+    A profiled request runs under cProfile and a stack sampler. Both are written to
+    output_path, as .pstats and .collapsed file, named after the X-Profile-Id header of
+    the response. Only max_profiles profiles are kept.
+
+    cProfile sees everything running on the event loop meanwhile, so requests handled
+    concurrently show up as well. Only one request is profiled at a time. Requests which
+    are not selected only pay for the header check.
+    """
+
+    def __init__(self, app: ASGIApp, settings: ProfilerSettings) -> None:
+        self.app = app
+        self.settings = settings
+
+        self._token = settings.token.encode() if settings.token else None
+        self._active = False
+        self._counter = count()
+
+    def _is_selected(self, scope: Scope) -> bool:
+        if self._token is not None:
+            for name, value in scope['headers']:
+                if name == b'x-profile' and secrets.compare_digest(value, self._token):
+                    return True
+
+        return self.settings.sample_rate > 0 and random.random() < self.settings.sample_rate
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope['type'] != 'http' or self._active or not self._is_selected(scope):
+            await self.app(scope, receive, send)
+            return
+
+        self._active = True
+        profile_id = f'{datetime.now():%Y%m%dT%H%M%S%f}-{next(self._counter)}'
+
+        async def send_with_profile_id(message: Message):
+            if message['type'] == 'http.response.start':
+                MutableHeaders(scope=message).append('X-Profile-Id', profile_id)
+            await send(message)
+
+        profiler = cProfile.Profile()
+        sampler = StackSampler(threading.get_ident(), self.settings.sample_interval)
+
+        start = time.perf_counter()
+        sampler.start()
+        profiler.enable()
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            profiler.disable()
+            sampler.stop()
+            duration = time.perf_counter() - start
+            self._active = False
+
+            route = getattr(scope.get('route'), 'path', 'unmatched')
+            route = re.sub(r'[^A-Za-z0-9]+', '-', route).strip('-') or 'root'
+            name = f'{profile_id}_{scope["method"]}_{route}_{duration * 1000:.0f}ms'
+
+            # The response is sent already, writing only delays the end of the request task
+            await asyncio.to_thread(self._write, name, profiler, sampler)
+
+    def _write(self, name: str, profiler: cProfile.Profile, sampler: StackSampler):
+        output_path = Path(self.settings.output_path)
+        output_path.mkdir(parents=True, exist_ok=True)
+
+        profiler.dump_stats(output_path.joinpath(f'{name}.pstats'))
+        output_path.joinpath(f'{name}.collapsed').write_text(sampler.get_collapsed())
+
+        self._rotate(output_path)
+
+    def _rotate(self, output_path: Path):
+        # Names start with the time of the request, so sorting them sorts by age
+        names = sorted({file.stem for file in output_path.glob('*.pstats')} |
+                       {file.stem for file in output_path.glob('*.collapsed')})
+
+        for name in names[:max(len(names) - self.settings.max_profiles, 0)]:
+            for suffix in ('.pstats', '.collapsed'):
+                output_path.joinpath(name + suffix).unlink(missing_ok=True)
@@ -0,0 +1,19 @@
+from typing import Any
+
+import orjson
+from fastapi import Response
+from pydantic import BaseModel
+
+
+class TrustedJSONResponse(Response):
+    """ Serializes DTOs built by the service layer with orjson
+
+    Returned directly from a route, the DTO is not validated again against the response model.
+    The response model of the route is still used for the OpenAPI docs.
+    """
+    media_type = 'application/json'
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, BaseModel):
+            content = content.model_dump()
+        return orjson.dumps(content)
@@ -1,20 +1,34 @@
-from typing import Annotated, List
-
-from fastapi import FastAPI, Depends, HTTPException, status, BackgroundTasks
+import time
+import asyncio
+import secrets
+from contextlib import asynccontextmanager
+from typing import Annotated, List, Optional
+
+from fastapi import FastAPI, Depends, Header, HTTPException, Query, Response, status
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 
-from src.email_sender import (
-    send_verification_email,
-    send_message_email,
-    send_password_reset_email
+from src.email_sender import load_email_templates
+from src.email_outbox import (
+    start_email_dispatcher,
+    stop_email_dispatcher,
+    notify_email_dispatcher,
 )
+from src.routes.middleware import QueryStatsMiddleware, MetricsMiddleware, record_query_metrics
+from src.routes.responses import TrustedJSONResponse
+from src.routes.profiler import ProfilerMiddleware
 from src.routes.api_utils import (
     get_current_active_user,
+    get_current_admin_user,
+    get_config,
     get_serivce,
 )
 from src.routes.dto import (
     EmailVerificationDate,
     GuestDto,
+    GuestPatchDto,
     LoginData,
     ForgetPasswordRequestDto,
     ResetPasswordRequestDto,
@@ -22,15 +36,67 @@ from src.routes.dto import (
     ContactListDto,
     LoginResponseDto,
     GuestListDto,
-    Message,
-    MessageDto
+    MessageDto,
+    RsvpSummaryDto,
 )
-from src.database.db_tables import User
-from src.config.app_config import load_config
-from src.business_logic.services import Service
-
-
-app_v1 = FastAPI()
+from src.database.db import (
+    init_db,
+    dispose_db,
+    init_async_db,
+    dispose_async_db,
+    get_db,
+    get_async_session_factory,
+)
+from src.business_logic.user_cache import CachedUser, user_cache
+from src.business_logic.contact_cache import contact_cache
+from src.config.app_config import Config, load_config
+from src.business_logic.services import AsyncService
+from src.business_logic.rsvp_summary import get_rsvp_summary
+from src.business_logic.rsvp_events import rsvp_events, stream_events
+from src.business_logic.guest_export import ExportFormat, stream_guest_export
+from src.business_logic.revisions import get_guests_etag, get_roster_etag, etag_matches
+from src.security import PasswordHashingBusyError, configure_password_hashing
+from src.smtp_pool import close_smtp_pools, close_async_smtp_pools
+from src.metrics import REGISTRY, CONTENT_TYPE, EMAIL_OUTBOX
+from src.database.db_tables import EmailOutbox
+from src.database.models.outbox_status import OutboxStatus
+from src.database.instrumentation import add_query_stats_sink
+from src.email_transport import close_email_transports
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    config = load_config()
+
+    # Missing or broken templates fail the startup instead of the first email
+    load_email_templates(auto_reload=config.email.template_auto_reload)
+
+    # One pooled engine for the whole process, shared by all requests
+    await init_async_db(config)
+    configure_password_hashing(config.security)
+    user_cache.configure(max_size=config.api.user_cache_size, ttl=config.api.user_cache_ttl)
+    contact_cache.configure(ttl=config.api.contact_cache_ttl)
+    rsvp_events.configure(queue_size=config.api.event_queue_size)
+
+    # Emails are sent from the outbox, here or by a separate `python -m src.email_outbox`
+    if config.outbox.run_in_process:
+        init_db(config)
+        start_email_dispatcher(config)
+    yield
+    # Waits for the email being sent without blocking the event loop, the rest of the
+    # claimed batch is sent again after claim_timeout
+    await asyncio.to_thread(stop_email_dispatcher)
+    await dispose_async_db()
+    dispose_db()
+    close_email_transports()
+    close_smtp_pools()
+    await close_async_smtp_pools()
+
+
+app_v1 = FastAPI(lifespan=lifespan)
+
+# Middlewares are set up once, routes read the config through get_config to see reloads
+app_config = load_config()
 
 origins = [
     "http://localhost",
@@ -38,10 +104,8 @@ origins = [
     "http://172.18.0.2",
 ]
 
-config = load_config()
-
-if config.frontend_base_url:
-    origins.append(config.frontend_base_url)
+if app_config.frontend_base_url:
+    origins.append(app_config.frontend_base_url)
 
 app_v1.add_middleware(
     CORSMiddleware,
@@ -51,6 +115,72 @@ app_v1.add_middleware(
     allow_headers=["*"],
 )
 
+app_v1.add_middleware(QueryStatsMiddleware)
+# Not even installed unless enabled, so there is no overhead by default
+if app_config.profiler.enabled:
+    app_v1.add_middleware(ProfilerMiddleware, settings=app_config.profiler)
+# Outermost, so the latency includes the other middlewares
+app_v1.add_middleware(MetricsMiddleware)
+add_query_stats_sink(record_query_metrics)
+
+
+def _password_hashing_busy():
+    return HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                         detail='Too many requests, try again later',
+                         headers={'Retry-After': '1'})
+
+
+def _set_etag(response: Response, etag: str, private: bool = False) -> Response:
+    response.headers['ETag'] = etag
+    # Clients may keep the response but have to revalidate it on every use
+    response.headers['Cache-Control'] = 'private, no-cache' if private else 'no-cache'
+    return response
+
+
+def _not_modified(etag: str, private: bool = False) -> Response:
+    return _set_etag(Response(status_code=status.HTTP_304_NOT_MODIFIED), etag, private)
+
+
+def _check_metrics_token(config: Config, authorization: Optional[str]):
+    if config.api.metrics_token is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Not Found')
+
+    expected = f'Bearer {config.api.metrics_token}'
+    if authorization is None or not secrets.compare_digest(authorization.encode(),
+                                                           expected.encode()):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
+                            detail='Could not validate credentials',
+                            headers={'WWW-Authenticate': 'Bearer'})
+
+
+# Monotonic time until which the outbox gauges are reused by scrapes
+_outbox_gauges_expiry = 0.0
+
+
+async def _update_outbox_gauges(db: AsyncSession, ttl: float):
+    global _outbox_gauges_expiry
+
+    if time.monotonic() < _outbox_gauges_expiry:
+        return
+    # Set before the query, concurrent scrapes reuse the current values meanwhile
+    _outbox_gauges_expiry = time.monotonic() + ttl
+
+    counts = dict((await db.execute(select(EmailOutbox.status, func.count())
+                                    .group_by(EmailOutbox.status))).all())
+    for outbox_status in OutboxStatus:
+        EMAIL_OUTBOX.labels(outbox_status.name.lower()).set(counts.get(outbox_status, 0))
+
+
+@app_v1.get('/metrics', include_in_schema=False)
+async def metrics(authorization: Annotated[Optional[str], Header()] = None,
+                  db: AsyncSession = Depends(get_db),
+                  config: Config = Depends(get_config)):
+    """ Metrics in the Prometheus text format, for scrapers with the metrics token """
+    _check_metrics_token(config, authorization)
+    await _update_outbox_gauges(db, config.api.metrics_outbox_ttl)
+
+    return Response(content=REGISTRY.render(), media_type=CONTENT_TYPE)
+
 
 @app_v1.get('/ping')
 async def ping():
@@ -58,41 +188,42 @@ async def ping():
 
 
 @app_v1.post('/user-register')
-async def register_user(background_task: BackgroundTasks,
-                        data: RegistrationData,
-                        service: Service = Depends(get_serivce)):
+async def register_user(data: RegistrationData,
+                        service: AsyncService = Depends(get_serivce)):
 
     try:
-        user, email_token = service.register_user(registration_data=data)
+        await service.register_user(registration_data=data)
 
-        # Send verification email
-        background_task.add_task(func=send_verification_email,
-                                 receiver_email=user.email,
-                                 verification_token=email_token)
+        # The verification email was added to the outbox
+        notify_email_dispatcher()
         return {'status': 'success', 'message': 'Verification email send'}
+    except PasswordHashingBusyError:
+        raise _password_hashing_busy()
     except Exception:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
                             detail='User registration failed')
 
 
-@app_v1.post('/email-verification')
+@app_v1.post('/email-verification', response_model=LoginResponseDto)
 async def verify_email(email_verification: EmailVerificationDate,
-                       service: Service = Depends(get_serivce)) -> LoginResponseDto:
+                       service: AsyncService = Depends(get_serivce)):
     try:
-        loginResponseDto = service.verify_email(email_verification=email_verification)
-        return loginResponseDto
+        loginResponseDto = await service.verify_email(email_verification=email_verification)
+        return TrustedJSONResponse(loginResponseDto)
     except Exception:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
                             detail='Email verification failed')
 
 
-@app_v1.post('/login')
+@app_v1.post('/login', response_model=LoginResponseDto)
 async def login(data: LoginData,
-                service: Service = Depends(get_serivce)) -> LoginResponseDto:
+                service: AsyncService = Depends(get_serivce)):
 
     try:
-        loginResponseDto = service.login(data.email, data.password)
-        return loginResponseDto
+        loginResponseDto = await service.login(data.email, data.password)
+        return TrustedJSONResponse(loginResponseDto)
+    except PasswordHashingBusyError:
+        raise _password_hashing_busy()
     except Exception:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
                             detail="Incorrect username or password",
@@ -100,45 +231,54 @@ async def login(data: LoginData,
 
 
 @app_v1.post('/forget-password')
-async def forget_password(background_task: BackgroundTasks,
-                          data: ForgetPasswordRequestDto,
-                          service: Service = Depends(get_serivce)):
+async def forget_password(data: ForgetPasswordRequestDto,
+                          service: AsyncService = Depends(get_serivce)):
 
-    forget_password_dto = service.forget_password(data)
+    forget_password_dto = await service.forget_password(data)
 
     if forget_password_dto is None:
         return {'message': 'ok'}
 
-    background_task.add_task(func=send_password_reset_email,
-                             forget_password_dto=forget_password_dto)
+    notify_email_dispatcher()
 
 
 @app_v1.post('/reset-password')
-async def reset_password(data: ResetPasswordRequestDto, service: Service = Depends(get_serivce)):
+async def reset_password(data: ResetPasswordRequestDto,
+                         service: AsyncService = Depends(get_serivce)):
 
     try:
-        service.reset_password(reset_password_dto=data)
+        await service.reset_password(reset_password_dto=data)
         return {'message': 'ok'}
+    except PasswordHashingBusyError:
+        raise _password_hashing_busy()
     except Exception:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
                             detail="Failed to reset password",
                             headers={"WWW-Autenticate": "Bearer"})
 
 
-@app_v1.get('/guest-info')
-async def guest_info(current_user: Annotated[User, Depends(get_current_active_user)],
-                     service: Service = Depends(get_serivce)) -> GuestListDto:
-    guests = service.get_guests_of_user(current_user)
-    return guests
+@app_v1.get('/guest-info', response_model=GuestListDto)
+async def guest_info(current_user: Annotated[CachedUser, Depends(get_current_active_user)],
+                     if_none_match: Annotated[Optional[str], Header()] = None,
+                     db: AsyncSession = Depends(get_db),
+                     service: AsyncService = Depends(get_serivce)):
+    # Read before the guests, a concurrent update then results in an outdated ETag only
+    etag = await get_guests_etag(db, current_user.id)
+    if etag_matches(if_none_match, etag):
+        return _not_modified(etag, private=True)
+
+    guests = await service.get_guests_of_user(current_user)
+    return _set_etag(TrustedJSONResponse(guests), etag, private=True)
 
 
 @app_v1.post('/guest-info')
 async def set_guest_info(data: List[GuestDto],
-                         current_user: Annotated[User, Depends(get_current_active_user)],
-                         service: Service = Depends(get_serivce)):
+                         current_user: Annotated[CachedUser, Depends(get_current_active_user)],
+                         service: AsyncService = Depends(get_serivce)):
 
     try:
-        no_updated_guests = service.update_guests_of_user(guest_dtos=data, user=current_user)
+        no_updated_guests = await service.update_guests_of_user(guest_dtos=data,
+                                                                user=current_user)
         return {'Guests': f'Registered {no_updated_guests} guests'}
     except Exception:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
@@ -146,23 +286,67 @@ async def set_guest_info(data: List[GuestDto],
                             headers={"WWW-Autenticate": "Bearer"})
 
 
-@app_v1.get('/contact_info')
-async def get_contact_info(service: Service = Depends(get_serivce)) -> ContactListDto:
-    response = service.get_contact_info()
-    return response
+@app_v1.patch('/guest-info')
+async def patch_guest_info(data: List[GuestPatchDto],
+                           current_user: Annotated[CachedUser, Depends(get_current_active_user)],
+                           service: AsyncService = Depends(get_serivce)):
+    """ Updates only the given fields of the guests, e.g. on autosave """
+    try:
+        no_updated_guests = await service.patch_guests_of_user(guest_patches=data,
+                                                               user=current_user)
+        return {'Guests': f'Updated {no_updated_guests} guests'}
+    except Exception:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
+                            detail="Incorrect guest",
+                            headers={"WWW-Autenticate": "Bearer"})
 
 
-@app_v1.post('/send_message')
-async def send_message(background_task: BackgroundTasks, data: MessageDto,
-                       service: Service = Depends(get_serivce)):
-    email = service.send_message(data)
+@app_v1.get('/contact_info', response_model=ContactListDto)
+async def get_contact_info(if_none_match: Annotated[Optional[str], Header()] = None,
+                           db: AsyncSession = Depends(get_db),
+                           service: AsyncService = Depends(get_serivce)):
+    etag = await get_roster_etag(db)
+    if etag_matches(if_none_match, etag):
+        return _not_modified(etag)
+
+    contacts = await service.get_contact_info()
+    return _set_etag(TrustedJSONResponse(contacts), etag)
 
-    m = Message(subject=data.subject, message=data.message,
-                sender_email=data.sender_email,
-                sender_phone=data.sender_phone)
 
-    background_task.add_task(func=send_message_email,
-                             receiver_email=email['email'],
-                             message=m)
+@app_v1.post('/send_message')
+async def send_message(data: MessageDto,
+                       service: AsyncService = Depends(get_serivce)):
+    await service.send_message(data)
+    notify_email_dispatcher()
 
     return {'message', 'ok'}
+
+
+@app_v1.get('/admin/guest-export')
+async def export_guests(admin: Annotated[CachedUser, Depends(get_current_admin_user)],
+                        export_format: Annotated[ExportFormat, Query(alias='format')] = 'csv'):
+    """ Streams all guests with their RSVP answers, for admins only """
+    media_type = 'text/csv' if export_format == 'csv' else 'application/x-ndjson'
+    filename = f'guests.{export_format}'
+
+    return StreamingResponse(stream_guest_export(get_async_session_factory(), export_format),
+                             media_type=media_type,
+                             headers={'Content-Disposition': f'attachment; filename="{filename}"'})
+
+
+@app_v1.get('/admin/rsvp-summary', response_model=RsvpSummaryDto)
+async def rsvp_summary(admin: Annotated[CachedUser, Depends(get_current_admin_user)],
+                       db: AsyncSession = Depends(get_db)):
+    """ Number of guests per status, food and dessert option, for admins only """
+    return TrustedJSONResponse(await get_rsvp_summary(db))
+
+
+@app_v1.get('/admin/events')
+async def admin_events(admin: Annotated[CachedUser, Depends(get_current_admin_user)],
+                       config: Config = Depends(get_config)):
+    """ Streams registrations and RSVP changes as Server-Sent Events, for admins only """
+    heartbeat_interval = config.api.event_heartbeat_interval
+
+    return StreamingResponse(stream_events(rsvp_events, heartbeat_interval),
+                             media_type='text/event-stream',
+                             headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
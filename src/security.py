@@ -1,11 +1,48 @@
+import asyncio
 import secrets
 import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional, Tuple
 from passlib.context import CryptContext
 
+from src.config.app_config import SecuritySettings
+from src.metrics import PASSWORD_HASHING_SECONDS, PASSWORD_HASHING_REJECTED
+
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 
+class PasswordHashingBusyError(Exception):
+    """ Raised when all password hashing workers and queue slots are taken """
+
+
+# Bounded pool keeping bcrypt off the event loop, see configure_password_hashing()
+_hash_pool: Optional[ThreadPoolExecutor] = None
+_hash_slots: Optional[threading.BoundedSemaphore] = None
+
+
+def configure_password_hashing(settings: SecuritySettings):
+    """ Applies bcrypt cost and worker pool size
+
+    Hashes with another cost than the configured one are reported as outdated by
+    verify_and_update_password().
+    """
+    global _hash_pool, _hash_slots
+
+    rounds = settings.bcrypt_rounds
+    pwd_context.update(bcrypt__default_rounds=rounds,
+                       bcrypt__min_rounds=rounds,
+                       bcrypt__max_rounds=rounds)
+
+    if _hash_pool is not None:
+        _hash_pool.shutdown(wait=False)
+
+    _hash_pool = ThreadPoolExecutor(max_workers=settings.hash_workers,
+                                    thread_name_prefix='password-hashing')
+    _hash_slots = threading.BoundedSemaphore(settings.hash_workers + settings.hash_queue_size)
+
+
 def generate_token(length: int = 32):
     random_bytes = secrets.token_bytes(length)
     return random_bytes.hex()
@@ -23,8 +60,51 @@ def verify_token(clear_code: str, hashed_code: str) -> bool:
 
 
 def hash_password(input_string: str):
-    return pwd_context.hash(input_string)
+    with PASSWORD_HASHING_SECONDS.labels('hash').time():
+        return pwd_context.hash(input_string)
 
 
 def verify_password(secret, hashed_password) -> bool:
-    return pwd_context.verify(secret=secret, hash=hashed_password)
+    with PASSWORD_HASHING_SECONDS.labels('verify').time():
+        return pwd_context.verify(secret=secret, hash=hashed_password)
+
+
+def verify_and_update_password(secret, hashed_password) -> Tuple[bool, Optional[str]]:
+    """ Verifies a password and rehashes it if the stored hash is outdated
+
+    Returns:
+        Tuple[bool, Optional[str]]: If the password is valid and the new hash, if any
+    """
+    # Includes the rehash of an outdated hash
+    with PASSWORD_HASHING_SECONDS.labels('verify').time():
+        return pwd_context.verify_and_update(secret=secret, hash=hashed_password)
+
+
+async def _run_in_hash_pool(func: Callable, *args):
+    if _hash_pool is None:
+        configure_password_hashing(SecuritySettings())
+
+    slots = _hash_slots
+
+    # Fail fast instead of queueing without bound when logins pile up
+    if not slots.acquire(blocking=False):
+        PASSWORD_HASHING_REJECTED.inc()
+        raise PasswordHashingBusyError()
+
+    try:
+        future = _hash_pool.submit(func, *args)
+    except Exception:
+        slots.release()
+        raise
+
+    future.add_done_callback(lambda _: slots.release())
+    return await asyncio.wrap_future(future)
+
+
+async def hash_password_async(input_string: str) -> str:
+    return await _run_in_hash_pool(hash_password, input_string)
+
+
+async def verify_and_update_password_async(secret,
+                                           hashed_password) -> Tuple[bool, Optional[str]]:
+    return await _run_in_hash_pool(verify_and_update_password, secret, hashed_password)
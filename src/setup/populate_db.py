@@ -4,10 +4,10 @@ import pathlib
 import logging
 from typing import List
 
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-
 from src.security import generate_token, hash_token
+from src.business_logic.revisions import bump_roster_revision
+from src.business_logic.rsvp_summary import rebuild_rsvp_summary
+from src.business_logic.contact_cache import contact_cache
 from src.database.db_tables import User, Guest, Role
 from src.database.models.user_status import UserStatus
 from src.database.models.food_options import FoodOption
@@ -16,6 +16,7 @@ from src.database.models.guest_status import GuestStatus
 from src.database.models.guest_role import GuestRole
 from src.setup.qr_code import QrCodeImageGenerator
 from src.database.db_base import Base
+from src.database.db import init_db, get_session_factory
 
 from src.config.app_config import load_config
 
@@ -43,10 +44,9 @@ def populate_db():
     sql_file.parent.mkdir(parents=True, exist_ok=True)
 
     # Create table
-    engine = create_engine(f"sqlite:///{sql_file}", echo=True,
-                           connect_args={"check_same_thread": False})
+    engine = init_db(config)
 
-    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    SessionLocal = get_session_factory()
 
     Base.metadata.create_all(engine)
 
@@ -112,7 +112,12 @@ def populate_db():
 
         session.add(user)
 
+    # Contact lists and guest infos cached by clients are outdated
+    bump_roster_revision(session)
+    rebuild_rsvp_summary(session)
+
     session.commit()
+    contact_cache.invalidate()
     session.close()
 
     with open(invitation_filepath, 'w') as f:
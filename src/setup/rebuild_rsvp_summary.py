@@ -0,0 +1,22 @@
+import logging
+
+from src.business_logic.rsvp_summary import rebuild_rsvp_summary
+from src.database.db import init_db, get_session_factory
+from src.config.app_config import load_config
+
+
+def main():
+    """ Recounts the RSVP summary from the guest table, e.g. after guests were edited by hand """
+    logging.basicConfig(level=logging.INFO)
+
+    init_db(load_config())
+
+    with get_session_factory()() as session:
+        rebuild_rsvp_summary(session)
+        session.commit()
+
+    logging.info('RSVP summary rebuilt')
+
+
+if __name__ == '__main__':
+    main()
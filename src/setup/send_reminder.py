@@ -1,8 +1,17 @@
+import os
 import csv
+import time
+import logging
+import threading
 from pathlib import Path
 import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, List, Optional, Set, Tuple
 
-from src.email_sender import send_reminer_email
+from src.config.app_config import load_config
+from src.email_sender import create_reminder_email, send_reminer_email
+from src.smtp_pool import close_smtp_pools
+from src.email_transport import close_email_transports
 
 
 def read_csv_and_create_dict(file_path):
@@ -27,12 +36,114 @@ def read_csv_and_create_dict(file_path):
     return email_dict
 
 
+class RateLimiter:
+    """ Spreads calls of wait() evenly, at most per_minute calls per minute (0 = unlimited) """
+
+    def __init__(self, per_minute: float) -> None:
+        self.interval = 60 / per_minute if per_minute > 0 else 0
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+
+        time.sleep(slot - now)
+
+
+class Checkpoint:
+    """ Append-only file of the addresses which already received the reminder """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+
+        self.done: Set[str] = set()
+        if path.exists():
+            self.done = {line.strip() for line in path.read_text().splitlines() if line.strip()}
+
+    def add(self, email: str):
+        with self._lock:
+            with self.path.open('a') as f:
+                f.write(email + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+            self.done.add(email)
+
+
+def send_reminders(email_dict: Dict[str, List[Tuple[str, str]]],
+                   checkpoint: Optional[Checkpoint] = None,
+                   workers: int = 2,
+                   rate_per_minute: float = 60,
+                   send: Callable[..., None] = send_reminer_email) -> Dict[str, int]:
+    """ Sends the reminders concurrently, skipping addresses of the checkpoint
+
+    Failed addresses are not added to the checkpoint, so they are retried by the next run.
+
+    Returns:
+        Dict[str, int]: Number of sent, skipped and failed reminders
+    """
+    done = checkpoint.done if checkpoint is not None else set()
+    pending = {email: guests for email, guests in email_dict.items() if email not in done}
+
+    stats = {'sent': 0, 'skipped': len(email_dict) - len(pending), 'failed': 0}
+    if stats['skipped']:
+        logging.info(f'Skipping {stats["skipped"]} addresses of the checkpoint')
+
+    limiter = RateLimiter(rate_per_minute)
+
+    def send_one(email: str, guests: List[Tuple[str, str]]):
+        limiter.wait()
+        send(guests=guests, receiver_email=email)
+        if checkpoint is not None:
+            checkpoint.add(email)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(send_one, email, guests): email
+                   for email, guests in pending.items()}
+
+        for i, future in enumerate(as_completed(futures), start=1):
+            email = futures[future]
+            try:
+                future.result()
+                stats['sent'] += 1
+                logging.info(f'[{i}/{len(pending)}] Sent reminder to {email}')
+            except Exception as e:
+                stats['failed'] += 1
+                logging.error(f'[{i}/{len(pending)}] Failed to send reminder to {email}. {e}')
+
+    return stats
+
+
+def render_reminders(email_dict: Dict[str, List[Tuple[str, str]]]):
+    """ Renders all reminders without sending them """
+    for email, guests in email_dict.items():
+        message = create_reminder_email(guests=guests, receiver_email=email)
+        print(f'To: {message["To"]} | {message["Subject"]} | '
+              f'{len(message.as_string())} bytes | {", ".join(name for _, name in guests)}')
+
+
 def main():
     parser = argparse.ArgumentParser(description='Send reminder email.')
     parser.add_argument('file_path', type=str,
                         help='The path to the CSV file [gender, firstname, lastname, email]')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Number of reminders sent concurrently (default: smtp_pool_size)')
+    parser.add_argument('--rate', type=float, default=60,
+                        help='Maximum number of reminders per minute, 0 for no limit')
+    parser.add_argument('--checkpoint', type=str, default=None,
+                        help='File recording the sent addresses (default: <file_path>.sent)')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='Only render the reminders, nothing is sent')
     args = parser.parse_args()
 
+    logging.basicConfig(level=logging.INFO)
+
     file_path = Path(args.file_path)
 
     if not file_path.exists():
@@ -40,8 +151,23 @@ def main():
 
     email_dict = read_csv_and_create_dict(file_path)
 
-    for email, guests in email_dict.items():
-        send_reminer_email(guests=guests, receiver_email=email)
+    if args.dry_run:
+        render_reminders(email_dict)
+        return
+
+    checkpoint_path = Path(args.checkpoint) if args.checkpoint \
+        else file_path.with_name(file_path.name + '.sent')
+    workers = args.workers or load_config().email.smtp_pool_size
+
+    try:
+        stats = send_reminders(email_dict, checkpoint=Checkpoint(checkpoint_path),
+                               workers=workers, rate_per_minute=args.rate)
+    finally:
+        close_email_transports()
+        close_smtp_pools()
+
+    logging.info(f'Sent {stats["sent"]}, skipped {stats["skipped"]}, failed {stats["failed"]} '
+                 f'reminders. Checkpoint: {checkpoint_path}')
 
 
 if __name__ == '__main__':
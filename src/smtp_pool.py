@@ -0,0 +1,315 @@
+import ssl
+import time
+import asyncio
+import logging
+import smtplib
+import threading
+from collections import deque
+from weakref import WeakKeyDictionary
+from typing import Deque, Dict, List, Set, Tuple, Union
+
+import aiosmtplib
+
+from src.config.app_config import EmailSettings
+
+
+class _PooledConnection:
+
+    def __init__(self, server: Union[smtplib.SMTP, aiosmtplib.SMTP]) -> None:
+        self.server = server
+        self.created = time.monotonic()
+        self.last_used = self.created
+        self.messages = 0
+
+    def close(self):
+        try:
+            self.server.quit()
+        except Exception:
+            self.server.close()
+
+
+class SmtpConnectionPool:
+    """ Thread-safe pool of logged in SMTP connections to one server
+
+    Idle connections are checked with NOOP before reuse and replaced once they exceed
+    the configured age or message count. A connection dropped by the server is replaced
+    and the message is sent once more.
+    """
+
+    def __init__(self, settings: EmailSettings) -> None:
+        self.settings = settings
+
+        self._idle: Deque[_PooledConnection] = deque()
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(settings.smtp_pool_size)
+        self._closed = False
+
+    def _connect(self) -> _PooledConnection:
+        server = smtplib.SMTP(host=self.settings.smtp_server, port=self.settings.smtp_port,
+                              timeout=self.settings.smtp_timeout)
+
+        try:
+            # Running localhost does not require TLS
+            if self.settings.smtp_server != 'localhost':
+                server.starttls(context=ssl.create_default_context())
+                server.login(user=self.settings.smtp_username,
+                             password=self.settings.smtp_password)
+        except Exception:
+            server.close()
+            raise
+
+        return _PooledConnection(server)
+
+    def _is_reusable(self, connection: _PooledConnection) -> bool:
+        now = time.monotonic()
+
+        if now - connection.created > self.settings.smtp_max_connection_age:
+            return False
+        if connection.messages >= self.settings.smtp_max_messages_per_connection:
+            return False
+
+        if now - connection.last_used > self.settings.smtp_noop_interval:
+            try:
+                return connection.server.noop()[0] == 250
+            except Exception:
+                return False
+
+        return True
+
+    def _acquire(self) -> _PooledConnection:
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                connection = self._idle.pop()
+
+            if self._is_reusable(connection):
+                return connection
+            connection.close()
+
+        return self._connect()
+
+    def _release(self, connection: _PooledConnection):
+        connection.last_used = time.monotonic()
+        with self._lock:
+            if not self._closed:
+                self._idle.append(connection)
+                return
+
+        # Sent while the pool was closed, e.g. replaced after a config reload
+        connection.close()
+
+    def send(self, from_addr: str, to_addrs: Union[str, List[str]], msg: str):
+        with self._slots:
+            for attempt in range(2):
+                connection = self._acquire()
+                try:
+                    connection.server.sendmail(from_addr=from_addr, to_addrs=to_addrs, msg=msg)
+                except (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused):
+                    # The server answered, the connection itself is fine
+                    self._release(connection)
+                    raise
+                except OSError as e:
+                    # Connection dropped, e.g. server restart or idle timeout
+                    connection.close()
+                    if attempt > 0:
+                        raise
+                    logging.warning(f'SMTP connection lost, reconnecting. {e}')
+                    continue
+                except BaseException:
+                    # Unknown state of the connection, e.g. after an encoding error
+                    connection.close()
+                    raise
+
+                connection.messages += 1
+                self._release(connection)
+                return
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            connections, self._idle = list(self._idle), deque()
+
+        for connection in connections:
+            connection.close()
+
+
+class AsyncSmtpConnectionPool:
+    """ asyncio counterpart of SmtpConnectionPool, bound to one event loop
+
+    Concurrent sends wait for one of the smtp_pool_size connections without blocking a thread.
+    """
+
+    def __init__(self, settings: EmailSettings) -> None:
+        self.settings = settings
+
+        self._idle: Deque[_PooledConnection] = deque()
+        self._slots = asyncio.Semaphore(settings.smtp_pool_size)
+        self._closed = False
+
+    async def _connect(self) -> _PooledConnection:
+        # Running localhost does not require TLS
+        if self.settings.smtp_server == 'localhost':
+            server = aiosmtplib.SMTP(hostname=self.settings.smtp_server,
+                                     port=self.settings.smtp_port,
+                                     timeout=self.settings.smtp_timeout, start_tls=False)
+        else:
+            server = aiosmtplib.SMTP(hostname=self.settings.smtp_server,
+                                     port=self.settings.smtp_port,
+                                     timeout=self.settings.smtp_timeout, start_tls=True,
+                                     tls_context=ssl.create_default_context(),
+                                     username=self.settings.smtp_username,
+                                     password=self.settings.smtp_password)
+
+        await server.connect()
+        return _PooledConnection(server)
+
+    async def _is_reusable(self, connection: _PooledConnection) -> bool:
+        now = time.monotonic()
+
+        if now - connection.created > self.settings.smtp_max_connection_age:
+            return False
+        if connection.messages >= self.settings.smtp_max_messages_per_connection:
+            return False
+        if not connection.server.is_connected:
+            return False
+
+        if now - connection.last_used > self.settings.smtp_noop_interval:
+            try:
+                return (await connection.server.noop()).code == 250
+            except Exception:
+                return False
+
+        return True
+
+    async def _acquire(self) -> _PooledConnection:
+        while self._idle:
+            connection = self._idle.pop()
+
+            if await self._is_reusable(connection):
+                return connection
+            await self._close_connection(connection)
+
+        return await self._connect()
+
+    def _release(self, connection: _PooledConnection):
+        connection.last_used = time.monotonic()
+        if self._closed:
+            connection.server.close()
+        else:
+            self._idle.append(connection)
+
+    async def _close_connection(self, connection: _PooledConnection):
+        try:
+            await connection.server.quit()
+        except Exception:
+            connection.server.close()
+
+    async def send(self, from_addr: str, to_addrs: Union[str, List[str]], msg: str):
+        async with self._slots:
+            for attempt in range(2):
+                connection = await self._acquire()
+                try:
+                    await connection.server.sendmail(from_addr, to_addrs, msg)
+                except (aiosmtplib.SMTPResponseException, aiosmtplib.SMTPRecipientsRefused):
+                    # The server answered, the connection itself is fine
+                    self._release(connection)
+                    raise
+                except OSError as e:
+                    # Connection dropped, e.g. server restart or idle timeout
+                    connection.server.close()
+                    if attempt > 0:
+                        raise
+                    logging.warning(f'SMTP connection lost, reconnecting. {e}')
+                    continue
+                except BaseException:
+                    # Unknown state of the connection, e.g. after an encoding error or cancel
+                    connection.server.close()
+                    raise
+
+                connection.messages += 1
+                self._release(connection)
+                return
+
+    async def close(self):
+        self._closed = True
+        connections, self._idle = list(self._idle), deque()
+
+        for connection in connections:
+            await self._close_connection(connection)
+
+
+_pools: Dict[Tuple, SmtpConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+# asyncio primitives belong to one event loop, so every loop has its own pools
+_async_pools: 'WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[Tuple, AsyncSmtpConnectionPool]]' \
+    = WeakKeyDictionary()
+# Closing pools replaced by get_async_smtp_pool, referenced until done
+_closing: Set[asyncio.Task] = set()
+
+
+def _get_pool_key(settings: EmailSettings) -> Tuple:
+    return (settings.smtp_server, settings.smtp_port,
+            settings.smtp_username, settings.smtp_password)
+
+
+def get_smtp_pool(settings: EmailSettings) -> SmtpConnectionPool:
+    """ Returns the shared pool for the server, port and credentials of the settings
+
+    Settings are read from the current config, so pools of other settings are outdated,
+    e.g. after a config reload with new credentials. They are removed and closed.
+    """
+    key = _get_pool_key(settings)
+
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is not None:
+            return pool
+
+        outdated = list(_pools.values())
+        _pools.clear()
+        pool = _pools[key] = SmtpConnectionPool(settings)
+
+    for outdated_pool in outdated:
+        outdated_pool.close()
+    return pool
+
+
+def close_smtp_pools():
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+
+    for pool in pools:
+        pool.close()
+
+
+def get_async_smtp_pool(settings: EmailSettings) -> AsyncSmtpConnectionPool:
+    """ Returns the shared pool of the running event loop for the settings
+
+    Pools of other settings are removed and closed in the background, see get_smtp_pool.
+    """
+    pools = _async_pools.setdefault(asyncio.get_running_loop(), {})
+    key = _get_pool_key(settings)
+
+    pool = pools.get(key)
+    if pool is not None:
+        return pool
+
+    for outdated_pool in pools.values():
+        task = asyncio.create_task(outdated_pool.close())
+        _closing.add(task)
+        task.add_done_callback(_closing.discard)
+    pools.clear()
+
+    pool = pools[key] = AsyncSmtpConnectionPool(settings)
+    return pool
+
+
+async def close_async_smtp_pools():
+    """ Closes the pools of the running event loop """
+    pools = _async_pools.pop(asyncio.get_running_loop(), {})
+
+    for pool in pools.values():
+        await pool.close()
@@ -10,7 +10,7 @@ os.environ['APP_ENV'] = 'testing'
 from src.routes.v1 import app_v1
 from src.routes.dto import LoginData, RegistrationData, EmailVerificationDate
 
-from tests.temporal_setup import setup_backend, setup_db
+from tests.temporal_setup import setup_backend, setup_db, dispatch_emails
 from tests.local_smtp_server import smtp_server
 
 class UserData:
@@ -23,6 +23,7 @@ def register_and_verify(client, smtp_server, token: str, email: str, password: s
     data = RegistrationData(email=email, password=password, invitation_token=token)
     response = client.post('/user-register', json=data.model_dump())
     assert response.status_code == 200
+    dispatch_emails()
 
     token = smtp_server.handler.get_latest_message().get_token()
     act_email = smtp_server.handler.get_latest_message().get_first_recipient()
@@ -1,4 +1,5 @@
 import os
+import asyncio
 import pathlib
 import json
 import tempfile
@@ -7,9 +8,24 @@ from contextlib import contextmanager
 
 import pytest
 import pandas as pd
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
 
 from src.setup.populate_db import populate_db
+from src.business_logic.services import Service
 from src.config.app_config import load_config
+from src.database.db import dispose_db, init_async_db, dispose_async_db
+from src.business_logic.user_cache import user_cache
+from src.business_logic.contact_cache import contact_cache
+from src.business_logic.rsvp_summary import rebuild_rsvp_summary
+from src.database.db import get_session_factory
+from src.database.db_tables import User, Guest, Role
+from src.email_outbox import EmailDispatcher
+from src.database.models.user_status import UserStatus
+from src.database.models.guest_status import GuestStatus
+from src.database.models.guest_role import GuestRole
+from src.database.models.food_options import FoodOption
+from src.database.models.dessert_options import DessertOption
 
 
 def get_guest_list(*args, **kwargs):
@@ -79,11 +95,84 @@ def setup_db():
         temp_directory() as temp_dir , qr_code_patch(temp_dir), \
         sql_file_path_patch(sql_file), invitation_path_patch(invitation_file):
         populate_db()
+        asyncio.run(init_async_db())
 
         yield
 
+        asyncio.run(dispose_async_db())
+        dispose_db()
+        user_cache.clear()
+        contact_cache.invalidate()
+
 
 @pytest.fixture
 def setup_backend(setup_db):
     config = load_config()
     return load_invitation_data(config.setup.get_invitation_file_path())
+
+
+def add_family(email: str, no_of_guests: int):
+    session = get_session_factory()()
+    user = User(email=email, invitation_hash=email, status=UserStatus.VERIFIED)
+    for i in range(no_of_guests):
+        user.associated_guests.append(Guest(first_name=f'first{i}', last_name='last',
+                                            status=GuestStatus.UNDEFINED,
+                                            food_option=FoodOption.UNDEFINED,
+                                            dessert_option=DessertOption.UNDEFINED,
+                                            allergies='', favorite_fairy_tale_character='',
+                                            favorite_tool='', roles=[Role(name=GuestRole.GUEST)]))
+    session.add(user)
+    rebuild_rsvp_summary(session)
+    session.commit()
+    session.close()
+
+
+@contextmanager
+def record_statements():
+    """ Records (statement, parameters) of all engines, commits are recorded as COMMIT
+
+    All engines are recorded, requests run on the async engine of the app.
+    """
+    statements = []
+
+    def record_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    def record_commit(conn):
+        statements.append(('COMMIT', None))
+
+    event.listen(Engine, 'before_cursor_execute', record_statement)
+    event.listen(Engine, 'commit', record_commit)
+    try:
+        yield statements
+    finally:
+        event.remove(Engine, 'before_cursor_execute', record_statement)
+        event.remove(Engine, 'commit', record_commit)
+
+
+def get_headers(email: str, **headers) -> dict:
+    """ Request headers authenticating the user with the email """
+    token = Service(None, load_config())._create_access_token(email)
+    return {'Authorization': f'Bearer {token}', **headers}
+
+
+def get_admin_headers() -> dict:
+    """ Registers admin@mail.com for the admin of the guest list and returns its headers """
+    session = get_session_factory()()
+    admin = session.query(Guest).filter_by(first_name='Emily').first().user
+    admin.email = 'admin@mail.com'
+    admin.status = UserStatus.VERIFIED
+    session.commit()
+    session.close()
+
+    return get_headers('admin@mail.com')
+
+
+def dispatch_emails() -> int:
+    """ Sends all due emails of the outbox, like the dispatcher of the app would """
+    dispatcher = EmailDispatcher(load_config().outbox)
+
+    count = 0
+    while (processed := dispatcher.run_once()) > 0:
+        count += processed
+    return count
@@ -0,0 +1,68 @@
+import os
+import json
+import time
+
+from src.config.app_config import ConfigProvider, load_config
+
+
+def write_config(path, **changes):
+    with open('./config/config_testing.json', 'r') as f:
+        data = json.load(f)
+    data.update(changes)
+
+    with open(path, 'w') as f:
+        f.write(json.dumps(data))
+
+
+def test_if_config_is_parsed_once():
+    os.environ['APP_ENV'] = 'testing'
+
+    assert load_config() is load_config()
+
+
+def test_if_config_can_be_injected():
+    with open('./config/config_testing.json', 'r') as f:
+        data = json.load(f)
+    data['frontend_base_url'] = 'https://injected.org'
+
+    assert load_config(data=data).frontend_base_url == 'https://injected.org'
+
+
+def test_if_modified_config_is_reloaded(tmp_path):
+    file = tmp_path.joinpath('config.json')
+    write_config(file, auto_reload=True)
+
+    provider = ConfigProvider(file, check_interval=0)
+    config = provider.get()
+    assert provider.get() is config
+
+    write_config(file, auto_reload=True, frontend_base_url='https://example.org')
+    os.utime(file, (time.time() + 1, time.time() + 1))
+
+    assert provider.get().frontend_base_url == 'https://example.org'
+
+
+def test_if_broken_config_keeps_previous_config(tmp_path):
+    file = tmp_path.joinpath('config.json')
+    write_config(file, auto_reload=True)
+
+    provider = ConfigProvider(file, check_interval=0)
+    config = provider.get()
+
+    with open(file, 'w') as f:
+        f.write('{"setup": ')
+    os.utime(file, (time.time() + 1, time.time() + 1))
+
+    assert provider.get() is config
+
+
+def test_if_config_is_not_reloaded_without_auto_reload(tmp_path):
+    file = tmp_path.joinpath('config.json')
+    write_config(file)
+
+    provider = ConfigProvider(file, check_interval=0)
+
+    write_config(file, frontend_base_url='https://example.org')
+    os.utime(file, (time.time() + 1, time.time() + 1))
+
+    assert provider.get().frontend_base_url == 'http://localhost:4200'
@@ -1,5 +1,5 @@
 from tests.register_admin import setup_register
-from tests.temporal_setup import setup_backend, setup_db
+from tests.temporal_setup import setup_backend, setup_db, dispatch_emails
 from tests.local_smtp_server import smtp_server
 
 from src.routes.dto import LoginData, MessageDto
@@ -27,6 +27,7 @@ def test_get_contacts(setup_register):
                           sender_phone='001 234 567 89')
 
         response = client.post('/send_message', json=data.model_dump())
+        dispatch_emails()
 
         message = smtp_server.handler.get_latest_message().get_html_content()
 
@@ -0,0 +1,144 @@
+import os
+import time
+import asyncio
+import threading
+from unittest.mock import patch
+
+import httpx
+import pytest
+from sqlalchemy import text
+
+os.environ['APP_ENV'] = 'testing'
+
+from src.business_logic.contact_cache import CachedContact, ContactCache, contact_cache
+from src.business_logic.services import Service
+from src.config.app_config import load_config
+from src.database.db import get_session_factory
+from src.routes.dto import MessageDto, RegistrationData
+from src.database.instrumentation import track_queries
+from src.routes.v1 import app_v1
+
+from tests.temporal_setup import setup_backend, setup_db
+
+
+def contacts(email: str = 'witness@mail.com'):
+    return {1: CachedContact(id=1, first_name='Jane', last_name='Doe', email=email)}
+
+
+def test_if_concurrent_misses_load_once():
+    cache = ContactCache(ttl=60)
+    calls = []
+
+    def load():
+        calls.append(1)
+        time.sleep(0.05)
+        return contacts()
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get(load)))
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert results == [contacts()] * 8
+
+
+def test_if_concurrent_requests_load_once_without_blocking_the_loop(setup_db):
+    load_contacts = Service._load_contacts
+
+    def slow_load_contacts(service):
+        # Every query suspends the loading request on the event loop
+        for _ in range(3):
+            service.db.execute(text('SELECT 1'))
+        return load_contacts(service)
+
+    async def get_contacts():
+        transport = httpx.ASGITransport(app=app_v1)
+        async with httpx.AsyncClient(transport=transport, base_url='http://test') as client:
+            # Opens the pooled connections, so the requests below overlap
+            await asyncio.gather(*[client.get('/contact_info') for _ in range(5)])
+            contact_cache.invalidate()
+
+            return await asyncio.gather(*[client.get('/contact_info') for _ in range(5)])
+
+    responses = []
+    loads = contact_cache.loads
+    with patch.object(Service, '_load_contacts', slow_load_contacts):
+        # A blocked event loop cannot time out itself
+        thread = threading.Thread(target=lambda: responses.extend(asyncio.run(get_contacts())),
+                                  daemon=True)
+        thread.start()
+        thread.join(timeout=5)
+
+    assert not thread.is_alive(), 'Event loop blocked'
+    assert [r.status_code for r in responses] == [200] * 5
+    assert len({r.content for r in responses}) == 1
+    assert contact_cache.loads == loads + 2
+
+
+def test_if_expired_contacts_are_reloaded():
+    cache = ContactCache(ttl=-1)
+
+    cache.get(contacts)
+    cache.get(contacts)
+
+    assert cache.get_stats()['loads'] == 2
+
+
+def test_if_load_invalidated_meanwhile_is_not_stored():
+    cache = ContactCache(ttl=60)
+
+    def load():
+        cache.invalidate()
+        return contacts('outdated@mail.com')
+
+    assert cache.get(load)[1].email == 'outdated@mail.com'
+    assert cache.get(contacts)[1].email == 'witness@mail.com'
+
+
+def test_if_contacts_without_email_cannot_receive_messages(setup_db):
+    session = get_session_factory()()
+    service = Service(session, load_config())
+
+    receiver_id = service.get_contact_info().contacts[0].id
+    message = MessageDto(receiver_id=receiver_id, subject='', message='',
+                         sender_email='', sender_phone='')
+
+    # Contacts without a registered email cannot receive messages
+    with pytest.raises(AttributeError):
+        service.send_message(message)
+
+    session.close()
+
+
+def test_if_registration_invalidates_contacts_and_messages_use_cache(setup_backend):
+    invitations = setup_backend
+    # The first invitation belongs to the admin
+    token = invitations[list(invitations.keys())[0]]['token']
+
+    session = get_session_factory()()
+    service = Service(session, load_config())
+    receiver_id = service.get_contact_info().contacts[0].id
+
+    service.register_user(RegistrationData(email='admin@mail.com', password='123',
+                                           invitation_token=token), password_hash='hash')
+
+    message = MessageDto(receiver_id=receiver_id, subject='', message='',
+                         sender_email='', sender_phone='')
+    loads, misses, hits = contact_cache.loads, contact_cache.misses, contact_cache.hits
+
+    assert service.send_message(message) == {'email': 'admin@mail.com'}
+    assert contact_cache.loads == loads + 1
+    assert contact_cache.misses == misses + 1
+
+    # Resolved from the cache, only the outbox insert is left
+    with track_queries() as stats:
+        service.send_message(message)
+    assert stats.count == 1
+    assert contact_cache.hits == hits + 1
+    assert contact_cache.misses == misses + 1
+
+    session.close()
@@ -0,0 +1,189 @@
+import os
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import text, select, create_engine
+
+os.environ['APP_ENV'] = 'testing'
+
+from src.business_logic.services import Service, AsyncService
+from src.config.app_config import load_config
+from src.database.db import get_engine, get_session_factory, get_async_session_factory
+from src.database.db_tables import User, Guest
+from src.database.models.guest_status import GuestStatus
+from src.database.models.food_options import FoodOption
+from src.database.models.dessert_options import DessertOption
+from src.routes.api_utils import current_user_load_options
+from src.database.instrumentation import (
+    instrument_engine,
+    track_queries,
+    add_query_stats_sink,
+    remove_query_stats_sink
+)
+from src.routes.dto import GuestDto, GuestListDto, MessageDto, ResetPasswordRequestDto
+from src.routes.v1 import app_v1
+
+from tests.temporal_setup import setup_db, add_family, record_statements, get_headers
+
+
+def test_if_sqlite_pragmas_are_applied_on_connect(setup_db):
+    with get_engine().connect() as connection:
+        assert connection.execute(text('PRAGMA journal_mode')).scalar() == 'wal'
+        assert connection.execute(text('PRAGMA synchronous')).scalar() == 1  # normal
+        assert connection.execute(text('PRAGMA temp_store')).scalar() == 2  # memory
+        assert connection.execute(text('PRAGMA busy_timeout')).scalar() == 5000
+
+
+def test_if_async_service_reads_through_async_session(setup_db):
+    async def get_contacts():
+        async with get_async_session_factory()() as db:
+            return await AsyncService(db, load_config()).get_contact_info()
+
+    contacts = asyncio.run(get_contacts()).contacts
+
+    # The guest list contains one admin and two witnesses
+    assert len(contacts) == 3
+
+
+def load_user(session, email: str) -> User:
+    return session.execute(select(User).filter_by(email=email)
+                           .options(current_user_load_options)).scalars().first()
+
+
+def test_if_guest_info_query_count_is_independent_of_guest_count(setup_db):
+    client = TestClient(app=app_v1)
+    query_counts = []
+
+    for no_of_guests in [1, 5, 20]:
+        email = f'family{no_of_guests}@mail.com'
+        add_family(email, no_of_guests)
+
+        # User, ETag revision and guests with their roles, as served by the route
+        with record_statements() as statements:
+            response = client.get('/guest-info', headers=get_headers(email))
+
+        assert response.status_code == 200
+        assert len(response.json()['guests']) == no_of_guests
+        query_counts.append(len([s for s, _ in statements if s != 'COMMIT']))
+
+    assert query_counts[0] == query_counts[1] == query_counts[2]
+
+
+def test_if_guests_are_updated_with_a_single_statement(setup_db):
+    email = 'family@mail.com'
+    add_family(email, 10)
+
+    session = get_session_factory()()
+    user = load_user(session, email)
+    guest_dtos = [GuestDto(id=guest.id, first_name=guest.first_name, last_name=guest.last_name,
+                           joins=True, food_option=FoodOption.VEGETARIAN.value,
+                           dessert_option=DessertOption.SWEET.value, allergies='Nuts',
+                           favorite_fairy_tale_character='', favorite_tool='')
+                  for guest in user.associated_guests]
+
+    with record_statements() as statements:
+        no_of_guests = Service(session, load_config()).update_guests_of_user(guest_dtos, user)
+    session.close()
+
+    assert no_of_guests == 10
+    assert len([s for s, _ in statements if s.startswith('UPDATE guest_table')]) == 1
+
+    session = get_session_factory()()
+    for guest in load_user(session, email).associated_guests:
+        assert guest.status == GuestStatus.REGISTERED
+        assert guest.food_option == FoodOption.VEGETARIAN
+        assert guest.dessert_option == DessertOption.SWEET
+        assert guest.allergies == 'Nuts'
+    session.close()
+
+
+def test_if_hot_queries_use_indexes(setup_db):
+    email = 'family@mail.com'
+    add_family(email, 3)
+
+    session = get_session_factory()()
+    service = Service(session, load_config())
+
+    # Only contacts with a registered email can receive messages
+    admin = session.query(Guest).order_by(Guest.id).first()
+    admin.user.email = 'admin@mail.com'
+    session.commit()
+
+    with record_statements() as statements:
+        load_user(session, email)
+
+        contacts = service.get_contact_info().contacts
+        service.send_message(MessageDto(receiver_id=contacts[0].id, subject='', message='',
+                                        sender_email='', sender_phone=''))
+
+        with pytest.raises(AttributeError):
+            service.reset_password(ResetPasswordRequestDto(token='unknown', password='123'))
+    session.close()
+
+    # Lazy loads of the relationships
+    session = get_session_factory()()
+    with record_statements() as lazy_statements:
+        for guest in session.query(User).filter_by(email=email).first().associated_guests:
+            guest.roles
+    session.close()
+    statements += lazy_statements
+
+    with get_engine().connect() as connection:
+        for statement, parameters in statements:
+            if statement == 'COMMIT':
+                continue
+            plan = connection.exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}', parameters)
+            for row in plan:
+                assert not row.detail.startswith('SCAN'), f'{row.detail}: {statement}'
+
+
+def test_if_query_stats_are_reported_per_request(setup_db):
+    reports = []
+
+    def sink(route, stats):
+        reports.append((route, stats.count))
+
+    add_query_stats_sink(sink)
+    try:
+        response = TestClient(app=app_v1).get('/contact_info')
+    finally:
+        remove_query_stats_sink(sink)
+
+    assert response.status_code == 200
+    assert response.headers['Server-Timing'].startswith('db;dur=')
+    # Roster revision for the ETag and contacts
+    assert '2 queries' in response.headers['Server-Timing']
+    assert ('/contact_info', 2) in reports
+
+
+def test_if_slow_queries_are_logged_without_parameters(caplog):
+    engine = create_engine('sqlite://')
+    instrument_engine(engine, slow_query_threshold_ms=0)
+
+    with track_queries() as stats, engine.connect() as connection:
+        connection.execute(text('SELECT :secret'), {'secret': 'my-password'})
+
+    assert stats.count == 1
+    assert 'Slow query' in caplog.text
+    assert 'SELECT ?' in caplog.text
+    assert 'my-password' not in caplog.text
+
+
+def test_if_trusted_guest_info_matches_response_model(setup_db):
+    email = 'family@mail.com'
+    add_family(email, 3)
+
+    token = Service(db=None, config=load_config())._create_access_token(email)
+    client = TestClient(app=app_v1)
+    response = client.get('/guest-info', headers={'Authorization': f'Bearer {token}'})
+
+    assert response.headers['content-type'] == 'application/json'
+    guests = GuestListDto.model_validate(response.json()).guests
+    assert [g.first_name for g in guests] == ['first0', 'first1', 'first2']
+    assert all(g.joins and g.allergies == '' for g in guests)
+
+    # The response models are still documented
+    schema = client.get('/openapi.json').json()['paths']['/guest-info']['get']
+    assert schema['responses']['200']['content']['application/json']['schema'] == \
+        {'$ref': '#/components/schemas/GuestListDto'}
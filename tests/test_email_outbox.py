@@ -0,0 +1,153 @@
+import os
+import threading
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+os.environ['APP_ENV'] = 'testing'
+
+from src.config.app_config import OutboxSettings
+from src.database.db import get_session_factory
+from src.database.db_tables import EmailOutbox
+from src.database.models.email_kind import EmailKind
+from src.database.models.outbox_status import OutboxStatus
+from src.email_outbox import EmailDispatcher, enqueue_email
+
+from tests.temporal_setup import setup_db
+
+
+def add_email(**payload) -> int:
+    session = get_session_factory()()
+    email = enqueue_email(session, EmailKind.VERIFICATION, **payload)
+    session.commit()
+    id = email.id
+    session.close()
+    return id
+
+
+def load_email(id: int) -> EmailOutbox:
+    session = get_session_factory()()
+    email = session.get(EmailOutbox, id)
+    session.close()
+    return email
+
+
+def test_if_email_is_sent_and_payload_removed(setup_db):
+    id = add_email(receiver_email='test@mail.com', verification_token='123')
+    sent = []
+
+    with patch.dict('src.email_outbox._senders', {EmailKind.VERIFICATION: sent.append}):
+        assert EmailDispatcher(OutboxSettings()).run_once() == 1
+        assert EmailDispatcher(OutboxSettings()).run_once() == 0
+
+    assert sent == [{'receiver_email': 'test@mail.com', 'verification_token': '123'}]
+
+    email = load_email(id)
+    assert email.status == OutboxStatus.SENT
+    assert email.payload is None
+    assert email.sent_at is not None
+
+
+def test_if_failed_email_is_retried_with_backoff_and_dead_lettered(setup_db):
+    id = add_email(receiver_email='test@mail.com', verification_token='123')
+    settings = OutboxSettings(max_attempts=3, backoff_base=10, backoff_max=15)
+    dispatcher = EmailDispatcher(settings)
+
+    def fail(payload):
+        raise ConnectionRefusedError('SMTP server down')
+
+    with patch.dict('src.email_outbox._senders', {EmailKind.VERIFICATION: fail}):
+        before = datetime.utcnow()
+        assert dispatcher.run_once() == 1
+
+        email = load_email(id)
+        assert email.status == OutboxStatus.PENDING
+        assert email.attempts == 1
+        assert 'SMTP server down' in email.last_error
+        assert email.next_attempt_at >= before + timedelta(seconds=10)
+
+        # Not due yet
+        assert dispatcher.run_once() == 0
+
+        for delay in [15, 45]:
+            with patch('src.email_outbox.datetime') as mock_datetime:
+                mock_datetime.utcnow.return_value = datetime.utcnow() + timedelta(seconds=delay)
+                assert dispatcher.run_once() == 1
+
+    email = load_email(id)
+    assert email.status == OutboxStatus.DEAD
+    assert email.attempts == 3
+    assert email.payload == {'receiver_email': 'test@mail.com', 'verification_token': None}
+
+
+def test_if_claimed_emails_are_not_claimed_twice(setup_db):
+    ids = [add_email(receiver_email=f'test{i}@mail.com', verification_token='123')
+           for i in range(3)]
+    dispatcher = EmailDispatcher(OutboxSettings(batch_size=2, claim_timeout=60))
+
+    session = get_session_factory()()
+    first = dispatcher.claim_batch(session)
+    second = dispatcher.claim_batch(session)
+    third = dispatcher.claim_batch(session)
+
+    assert [e.id for e in first] == ids[:2]
+    assert [e.id for e in second] == ids[2:]
+    assert third == []
+
+    # Claims of a crashed dispatcher expire
+    with patch('src.email_outbox.datetime') as mock_datetime:
+        mock_datetime.utcnow.return_value = datetime.utcnow() + timedelta(seconds=61)
+        assert [e.id for e in dispatcher.claim_batch(session)] == ids[:2]
+
+    session.close()
+
+
+def test_if_stopped_dispatcher_leaves_rest_of_batch_claimed(setup_db):
+    ids = [add_email(receiver_email=f'test{i}@mail.com', verification_token='123')
+           for i in range(3)]
+    dispatcher = EmailDispatcher(OutboxSettings(batch_size=3, claim_timeout=60))
+    stop = threading.Event()
+    sent = []
+
+    def send_and_stop(payload):
+        sent.append(payload)
+        stop.set()
+
+    with patch.dict('src.email_outbox._senders', {EmailKind.VERIFICATION: send_and_stop}):
+        assert dispatcher.run_once(stop) == 1
+
+    assert len(sent) == 1
+    assert [load_email(id).status for id in ids] == [OutboxStatus.SENT,
+                                                     OutboxStatus.SENDING,
+                                                     OutboxStatus.SENDING]
+
+    # Sent again once the claim expired
+    with patch.dict('src.email_outbox._senders', {EmailKind.VERIFICATION: sent.append}):
+        with patch('src.email_outbox.datetime') as mock_datetime:
+            mock_datetime.utcnow.return_value = datetime.utcnow() + timedelta(seconds=61)
+            assert dispatcher.run_once() == 2
+
+
+def test_if_reclaimed_email_is_not_sent_twice(setup_db):
+    ids = [add_email(receiver_email=f'test{i}@mail.com', verification_token='123')
+           for i in range(2)]
+    settings = OutboxSettings(batch_size=2, claim_timeout=60)
+    slow, other = EmailDispatcher(settings), EmailDispatcher(settings)
+    sent = []
+
+    session = get_session_factory()()
+    batch = slow.claim_batch(session)
+
+    with patch.dict('src.email_outbox._senders', {EmailKind.VERIFICATION: sent.append}):
+        slow._send(session, batch[0])
+
+        # The second email waited in the batch longer than the claim timeout
+        with patch('src.email_outbox.datetime') as mock_datetime:
+            mock_datetime.utcnow.return_value = datetime.utcnow() + timedelta(seconds=61)
+            assert other.run_once() == 1
+
+        slow._send(session, batch[1])
+    session.close()
+
+    assert [payload['receiver_email'] for payload in sent] == ['test0@mail.com',
+                                                               'test1@mail.com']
+    assert [load_email(id).status for id in ids] == [OutboxStatus.SENT] * 2
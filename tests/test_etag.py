@@ -0,0 +1,87 @@
+import os
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+os.environ['APP_ENV'] = 'testing'
+
+from src.business_logic.services import AsyncService
+from src.business_logic.revisions import bump_roster_revision, etag_matches
+from src.database.db import get_session_factory
+from src.routes.dto import GuestDto
+from src.routes.v1 import app_v1
+
+from tests.temporal_setup import setup_db, add_family, get_headers
+
+
+def test_if_unchanged_guest_info_is_not_modified(setup_db):
+    add_family('family@mail.com', 2)
+    client = TestClient(app=app_v1)
+
+    response = client.get('/guest-info', headers=get_headers('family@mail.com'))
+    assert response.status_code == 200
+    etag = response.headers['ETag']
+    guests = response.json()['guests']
+
+    with patch.object(AsyncService, 'get_guests_of_user') as get_guests:
+        response = client.get('/guest-info',
+                              headers=get_headers('family@mail.com', **{'If-None-Match': etag}))
+        get_guests.assert_not_called()
+
+    assert response.status_code == 304
+    assert response.headers['ETag'] == etag
+    assert response.content == b''
+
+    # Updating the guests changes the ETag
+    data = [GuestDto(id=g['id'], first_name=g['first_name'], last_name=g['last_name'],
+                     joins=True, food_option=1, dessert_option=1, allergies='Nuts',
+                     favorite_fairy_tale_character='', favorite_tool='').model_dump()
+            for g in guests]
+    response = client.post('/guest-info', json=data, headers=get_headers('family@mail.com'))
+    assert response.status_code == 200
+
+    response = client.get('/guest-info',
+                          headers=get_headers('family@mail.com', **{'If-None-Match': etag}))
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+    assert response.json()['guests'][0]['allergies'] == 'Nuts'
+
+
+def test_if_guest_info_etags_are_per_user(setup_db):
+    add_family('family1@mail.com', 1)
+    add_family('family2@mail.com', 1)
+    client = TestClient(app=app_v1)
+
+    etag = client.get('/guest-info', headers=get_headers('family1@mail.com')).headers['ETag']
+
+    response = client.get('/guest-info',
+                          headers=get_headers('family2@mail.com', **{'If-None-Match': etag}))
+    assert response.status_code == 200
+
+
+def test_if_contact_info_changes_with_roster_revision(setup_db):
+    client = TestClient(app=app_v1)
+
+    response = client.get('/contact_info')
+    assert response.status_code == 200
+    etag = response.headers['ETag']
+
+    response = client.get('/contact_info', headers={'If-None-Match': f'W/{etag}, "other"'})
+    assert response.status_code == 304
+
+    session = get_session_factory()()
+    bump_roster_revision(session)
+    session.commit()
+    session.close()
+
+    response = client.get('/contact_info', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+
+
+def test_if_if_none_match_is_parsed():
+    assert etag_matches('"c1"', '"c1"')
+    assert etag_matches('"c0", W/"c1"', '"c1"')
+    assert etag_matches('*', '"c1"')
+    assert not etag_matches(None, '"c1"')
+    assert not etag_matches('"c2"', '"c1"')
@@ -0,0 +1,87 @@
+import os
+import csv
+import json
+import asyncio
+
+from fastapi.testclient import TestClient
+
+os.environ['APP_ENV'] = 'testing'
+
+from src.business_logic.guest_export import EXPORT_COLUMNS, stream_guest_export
+from src.database.db import get_session_factory, get_async_session_factory
+from src.database.db_tables import Guest
+from src.routes.v1 import app_v1
+
+from tests.temporal_setup import setup_db, add_family, get_headers, get_admin_headers
+
+
+def test_if_guests_are_exported_as_csv(setup_db):
+    add_family('family@mail.com', 2)
+    client = TestClient(app=app_v1)
+
+    response = client.get('/admin/guest-export', headers=get_admin_headers())
+
+    assert response.status_code == 200
+    assert response.headers['content-type'].startswith('text/csv')
+    assert 'guests.csv' in response.headers['content-disposition']
+
+    rows = list(csv.DictReader(response.text.splitlines()))
+    assert list(rows[0].keys()) == EXPORT_COLUMNS
+    # Guest list and the added family
+    assert len(rows) == 8
+    assert rows[0]['first_name'] == 'Emily'
+    assert rows[0]['roles'] == 'ADMIN'
+    assert rows[0]['email'] == 'admin@mail.com'
+    assert rows[-1]['status'] == 'UNDEFINED'
+    assert rows[-1]['food_option'] == 'UNDEFINED'
+
+
+def test_if_formulas_are_escaped_in_csv(setup_db):
+    add_family('family@mail.com', 1)
+    session = get_session_factory()()
+    guest = session.query(Guest).filter_by(first_name='first0').first()
+    guest.allergies = '=HYPERLINK("http://evil.com")'
+    guest.favorite_tool = '-1+2'
+    session.commit()
+    session.close()
+    client = TestClient(app=app_v1)
+    headers = get_admin_headers()
+
+    rows = list(csv.DictReader(client.get('/admin/guest-export', headers=headers).text
+                               .splitlines()))
+    assert rows[-1]['allergies'] == '\'=HYPERLINK("http://evil.com")'
+    assert rows[-1]['favorite_tool'] == "'-1+2"
+
+    # NDJSON is not opened by spreadsheets and keeps the values
+    guests = [json.loads(line) for line in
+              client.get('/admin/guest-export?format=ndjson', headers=headers).text.splitlines()]
+    assert guests[-1]['allergies'] == '=HYPERLINK("http://evil.com")'
+
+
+def test_if_guests_are_exported_as_ndjson(setup_db):
+    client = TestClient(app=app_v1)
+
+    response = client.get('/admin/guest-export?format=ndjson', headers=get_admin_headers())
+
+    guests = [json.loads(line) for line in response.text.splitlines()]
+    assert len(guests) == 6
+    assert [g['roles'] for g in guests[:3]] == ['ADMIN', 'WITNESS', 'WITNESS']
+    assert guests[3]['user_status'] == 'UNSEEN'
+
+
+def test_if_export_is_for_admins_only(setup_db):
+    add_family('family@mail.com', 1)
+    response = TestClient(app=app_v1).get('/admin/guest-export',
+                                          headers=get_headers('family@mail.com'))
+
+    assert response.status_code == 403
+
+
+def test_if_export_is_streamed_in_batches(setup_db):
+    async def collect():
+        return [chunk async for chunk in
+                stream_guest_export(get_async_session_factory(), 'ndjson', batch_size=2)]
+
+    chunks = asyncio.run(collect())
+
+    assert [chunk.count(b'\n') for chunk in chunks] == [2, 2, 2]
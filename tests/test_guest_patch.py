@@ -0,0 +1,83 @@
+import os
+
+from fastapi.testclient import TestClient
+
+os.environ['APP_ENV'] = 'testing'
+
+from src.database.db import get_session_factory
+from src.database.db_tables import Guest, User
+from src.database.models.guest_status import GuestStatus
+from src.database.models.food_options import FoodOption
+from src.routes.v1 import app_v1
+
+from tests.temporal_setup import setup_db, add_family, get_headers, record_statements
+
+
+def get_guests(email: str) -> list:
+    with get_session_factory()() as session:
+        return session.query(Guest).join(Guest.user).filter(User.email == email)\
+            .order_by(Guest.id).all()
+
+
+def test_if_only_changed_columns_are_written(setup_db):
+    email = 'family@mail.com'
+    add_family(email, 3)
+    first, second, third = [guest.id for guest in get_guests(email)]
+    client = TestClient(app=app_v1)
+
+    with record_statements() as statements:
+        response = client.patch('/guest-info', headers=get_headers(email),
+                                json=[{'id': first, 'allergies': 'Nuts'},
+                                      {'id': second, 'joins': True, 'food_option': 1},
+                                      {'id': third, 'allergies': ''}])
+
+    assert response.status_code == 200
+    assert response.json() == {'Guests': 'Updated 2 guests'}
+
+    updates = [s for s, _ in statements if s.startswith('UPDATE guest_table')]
+    assert sorted(updates) == ['UPDATE guest_table SET allergies=? WHERE guest_table.id = ?',
+                               'UPDATE guest_table SET food_option=?, status=? '
+                               'WHERE guest_table.id = ?']
+    assert statements[-1][0] == 'COMMIT'
+
+    guests = get_guests(email)
+    assert guests[0].allergies == 'Nuts'
+    assert guests[0].status == GuestStatus.UNDEFINED
+    assert guests[1].status == GuestStatus.REGISTERED
+    assert guests[1].food_option == FoodOption.VEGETARIAN
+    assert guests[1].allergies == ''
+
+
+def test_if_unchanged_patch_is_not_committed(setup_db):
+    email = 'family@mail.com'
+    add_family(email, 2)
+    guest_id = get_guests(email)[0].id
+    client = TestClient(app=app_v1)
+    client.patch('/guest-info', headers=get_headers(email),
+                 json=[{'id': guest_id, 'joins': False, 'allergies': 'Nuts'}])
+
+    with record_statements() as statements:
+        response = client.patch('/guest-info', headers=get_headers(email),
+                                json=[{'id': guest_id, 'joins': False, 'allergies': 'Nuts'},
+                                      {'id': guest_id}])
+
+    assert response.json() == {'Guests': 'Updated 0 guests'}
+    assert not [s for s, _ in statements
+                if s.startswith(('UPDATE', 'INSERT', 'DELETE', 'COMMIT'))]
+
+
+def test_if_patch_of_other_guests_is_rejected(setup_db):
+    add_family('family1@mail.com', 1)
+    add_family('family2@mail.com', 1)
+    other_id = get_guests('family2@mail.com')[0].id
+    client = TestClient(app=app_v1)
+
+    response = client.patch('/guest-info', headers=get_headers('family1@mail.com'),
+                            json=[{'id': other_id, 'allergies': 'Nuts'}])
+    assert response.status_code == 401
+
+    response = client.patch('/guest-info', headers=get_headers('family1@mail.com'),
+                            json=[{'id': get_guests('family1@mail.com')[0].id,
+                                   'food_option': 7}])
+    assert response.status_code == 401
+    assert get_guests('family2@mail.com')[0].allergies == ''
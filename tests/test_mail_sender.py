@@ -1,6 +1,27 @@
 import os
+import time
+import asyncio
+import smtplib
+from email.mime.text import MIMEText
+from unittest.mock import patch
 
-from src.email_sender import send_verification_email
+import pytest
+import aiosmtplib
+from jinja2 import TemplateNotFound, TemplateSyntaxError
+
+from src.email_sender import (
+    send_verification_email,
+    send_verification_email_async,
+    send_reminer_email_async,
+    TemplateRegistry,
+)
+from src.smtp_pool import close_smtp_pools, get_smtp_pool, close_async_smtp_pools
+from src.email_transport import (
+    EmailTransport,
+    MemoryTransport,
+    SpoolTransport,
+    get_email_transport,
+)
 from src.config.app_config import load_config
 from tests.local_smtp_server import smtp_server
 
@@ -21,3 +42,202 @@ def test_send_verification_email(smtp_server):
     act_content = smtp_server.handler.get_latest_message().get_html_content()
 
     assert f'<a href="{exp_url}">' in act_content
+
+
+def test_if_smtp_connection_is_reused(smtp_server):
+    os.environ['APP_ENV'] = 'testing'
+    close_smtp_pools()
+
+    prev_mail_count = smtp_server.handler.count_messages()
+
+    with patch('src.smtp_pool.smtplib.SMTP', wraps=smtplib.SMTP) as smtp:
+        for i in range(3):
+            send_verification_email(f'test{i}@gmail.com', verification_token='123')
+
+    assert smtp.call_count == 1
+    assert smtp_server.handler.count_messages() == prev_mail_count + 3
+
+
+def test_if_dropped_smtp_connection_is_replaced(smtp_server):
+    os.environ['APP_ENV'] = 'testing'
+    close_smtp_pools()
+
+    send_verification_email('test@gmail.com', verification_token='123')
+
+    # Simulate the server closing the idle connection
+    for connection in get_smtp_pool(load_config().email)._idle:
+        connection.server.close()
+
+    prev_mail_count = smtp_server.handler.count_messages()
+
+    send_verification_email('test@gmail.com', verification_token='456')
+
+    assert smtp_server.handler.count_messages() == prev_mail_count + 1
+
+
+def test_if_connection_is_closed_after_unexpected_error(smtp_server):
+    os.environ['APP_ENV'] = 'testing'
+    close_smtp_pools()
+    pool = get_smtp_pool(load_config().email)
+
+    with patch('src.smtp_pool.smtplib.SMTP.sendmail', side_effect=UnicodeEncodeError(
+            'ascii', 'ä', 0, 1, 'ordinal not in range(128)')):
+        with pytest.raises(UnicodeEncodeError):
+            pool.send(from_addr='sender@mail.com', to_addrs='test@gmail.com', msg='ä')
+
+    assert len(pool._idle) == 0
+
+    # The slot of the closed connection is free again
+    prev_mail_count = smtp_server.handler.count_messages()
+    send_verification_email('test@gmail.com', verification_token='123')
+    assert smtp_server.handler.count_messages() == prev_mail_count + 1
+
+
+def test_if_pool_of_outdated_settings_is_closed(smtp_server):
+    os.environ['APP_ENV'] = 'testing'
+    close_smtp_pools()
+    settings = load_config().email
+
+    send_verification_email('test@gmail.com', verification_token='123')
+    outdated_pool = get_smtp_pool(settings)
+    assert len(outdated_pool._idle) == 1
+
+    # E.g. new credentials after a config reload
+    pool = get_smtp_pool(settings.model_copy(update={'smtp_password': 'new'}))
+
+    assert pool is not outdated_pool
+    assert len(outdated_pool._idle) == 0
+    assert get_smtp_pool(settings) is not outdated_pool
+    close_smtp_pools()
+
+
+def test_if_async_emails_share_few_connections(smtp_server):
+    os.environ['APP_ENV'] = 'testing'
+    pool_size = load_config().email.smtp_pool_size
+
+    prev_mail_count = smtp_server.handler.count_messages()
+
+    async def send_all():
+        await asyncio.gather(*[send_verification_email_async(f'test{i}@gmail.com', f'token{i}')
+                               for i in range(10)])
+        await close_async_smtp_pools()
+
+    with patch('src.smtp_pool.aiosmtplib.SMTP', wraps=aiosmtplib.SMTP) as smtp:
+        asyncio.run(send_all())
+
+    assert smtp.call_count <= pool_size
+    assert smtp_server.handler.count_messages() == prev_mail_count + 10
+
+    tokens = {message.get_token() for message in smtp_server.handler.received_messages[-10:]}
+    assert tokens == {f'token{i}' for i in range(10)}
+
+
+def test_if_async_reminder_is_rendered_like_sync(smtp_server):
+    os.environ['APP_ENV'] = 'testing'
+    guests = [('female', 'Ava'), ('male', 'Juan')]
+
+    async def send():
+        await send_reminer_email_async(guests=guests, receiver_email='test@gmail.com')
+        await close_async_smtp_pools()
+
+    asyncio.run(send())
+
+    message = smtp_server.handler.get_latest_message()
+    assert message.get_first_recipient() == 'test@gmail.com'
+    assert 'Liebe Ava, Lieber Juan' in message.get_html_content()
+
+
+def test_if_incomplete_transport_cannot_be_created():
+    class SyncOnlyTransport(EmailTransport):
+        def send(self, message):
+            pass
+
+    with pytest.raises(TypeError):
+        SyncOnlyTransport()
+
+
+def test_if_memory_transport_is_selected_by_settings():
+    os.environ['APP_ENV'] = 'testing'
+    settings = load_config().email.model_copy(update={'transport': 'memory'})
+
+    with patch('src.email_sender.load_config') as config:
+        config.return_value.email = settings
+        send_verification_email('test@gmail.com', verification_token='123')
+        asyncio.run(send_verification_email_async('test@gmail.com', verification_token='456'))
+
+    transport = get_email_transport(settings)
+    assert isinstance(transport, MemoryTransport)
+    assert [m['To'] for m in transport.messages] == ['test@gmail.com', 'test@gmail.com']
+    transport.clear()
+
+
+def test_if_transport_of_outdated_settings_is_closed(tmp_path):
+    os.environ['APP_ENV'] = 'testing'
+    settings = load_config().email.model_copy(update={'transport': 'spool',
+                                                      'spool_path': tmp_path})
+
+    transport = get_email_transport(settings)
+    with patch.object(transport, 'close') as close:
+        memory_transport = get_email_transport(settings.model_copy(update={'transport': 'memory'}))
+
+    close.assert_called_once()
+    assert isinstance(memory_transport, MemoryTransport)
+    assert get_email_transport(settings) is not transport
+
+
+def test_if_memory_transport_keeps_only_the_latest_messages():
+    transport = MemoryTransport(max_messages=2)
+
+    for i in range(3):
+        message = MIMEText(f'message {i}')
+        message['To'] = f'test{i}@gmail.com'
+        transport.send(message)
+
+    assert [m['To'] for m in transport.messages] == ['test1@gmail.com', 'test2@gmail.com']
+
+
+def test_if_spool_transport_writes_maildir_in_fsync_batches(tmp_path):
+    transport = SpoolTransport(tmp_path, fsync_batch=3)
+
+    with patch('src.email_transport.os.fsync') as fsync:
+        for i in range(4):
+            message = MIMEText(f'message {i}')
+            message['To'] = f'test{i}@gmail.com'
+            transport.send(message)
+
+        # 3 files and the directory of the first batch
+        assert fsync.call_count == 4
+
+        transport.close()
+        assert fsync.call_count == 6
+
+    files = sorted(tmp_path.joinpath('new').iterdir())
+    assert len(files) == 4
+    assert all(file.suffix == '.eml' for file in files)
+    assert list(tmp_path.joinpath('tmp').iterdir()) == []
+    assert 'message 0' in files[0].read_text()
+
+
+def test_if_missing_template_fails_on_load(tmp_path):
+    with pytest.raises(TemplateNotFound):
+        TemplateRegistry(tmp_path, ['email_verification_template.html'])
+
+
+def test_if_broken_template_fails_on_load(tmp_path):
+    tmp_path.joinpath('broken.html').write_text('{% if %}')
+
+    with pytest.raises(TemplateSyntaxError):
+        TemplateRegistry(tmp_path, ['broken.html'])
+
+
+def test_if_changed_template_is_reloaded_with_auto_reload(tmp_path):
+    template_file = tmp_path.joinpath('template.html')
+    template_file.write_text('Hello {{ name }}')
+
+    registry = TemplateRegistry(tmp_path, ['template.html'], auto_reload=True)
+    assert registry.get('template.html').render(name='Ava') == 'Hello Ava'
+
+    template_file.write_text('Goodbye {{ name }}')
+    os.utime(template_file, (time.time() + 1, time.time() + 1))
+
+    assert registry.get('template.html').render(name='Ava') == 'Goodbye Ava'
@@ -0,0 +1,143 @@
+import os
+import asyncio
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+os.environ['APP_ENV'] = 'testing'
+
+from src.config.app_config import load_config
+from src.metrics import REGISTRY, Counter, Histogram, MetricsRegistry
+from src.routes.api_utils import get_config
+from src.routes.middleware import MetricsMiddleware
+from src.routes.v1 import app_v1
+
+from tests.temporal_setup import setup_db
+
+
+def get_metrics_headers() -> dict:
+    return {'Authorization': f'Bearer {load_config().api.metrics_token}'}
+
+
+def get_sample(text: str, sample: str) -> float:
+    for line in text.splitlines():
+        if line.startswith(sample + ' '):
+            return float(line.rsplit(' ', 1)[1])
+    return 0.0
+
+
+def test_if_histogram_is_rendered_cumulative():
+    registry = MetricsRegistry()
+    histogram = registry.register(Histogram('latency_seconds', 'Latency', ['route'],
+                                            buckets=[0.1, 1]))
+    counter = registry.register(Counter('requests_total', 'Requests', ['route']))
+
+    for value in [0.05, 0.5, 0.7, 3]:
+        histogram.labels('/a"b').observe(value)
+    counter.labels('/a"b').inc()
+
+    assert registry.render().splitlines() == [
+        '# HELP latency_seconds Latency',
+        '# TYPE latency_seconds histogram',
+        'latency_seconds_bucket{route="/a\\"b",le="0.1"} 1',
+        'latency_seconds_bucket{route="/a\\"b",le="1"} 3',
+        'latency_seconds_bucket{route="/a\\"b",le="+Inf"} 4',
+        'latency_seconds_sum{route="/a\\"b"} 4.25',
+        'latency_seconds_count{route="/a\\"b"} 4',
+        '# HELP requests_total Requests',
+        '# TYPE requests_total counter',
+        'requests_total{route="/a\\"b"} 1',
+    ]
+
+
+@patch('src.routes.v1._outbox_gauges_expiry', 0.0)
+def test_if_requests_are_recorded_per_route(setup_db):
+    client = TestClient(app=app_v1)
+
+    before = client.get('/metrics', headers=get_metrics_headers()).text
+    client.get('/contact_info')
+    client.get('/contact_info')
+    client.get('/unknown/12345')
+    after = client.get('/metrics', headers=get_metrics_headers())
+
+    assert after.headers['content-type'].startswith('text/plain; version=0.0.4')
+
+    def delta(sample: str) -> float:
+        return get_sample(after.text, sample) - get_sample(before, sample)
+
+    route = '{route="/contact_info",method="GET"'
+    assert delta('http_requests_total' + route + ',status="200"}') == 2
+    assert delta('http_request_duration_seconds_count' + route + '}') == 2
+    assert delta('http_requests_total{route="unmatched",method="GET",status="404"}') == 1
+    assert delta('db_queries_total{route="/contact_info"}') >= 2
+    assert delta('contact_cache_hits_total') == 1
+
+    # The scrape itself is in flight
+    assert get_sample(after.text, 'http_requests_in_flight') == 1
+    assert get_sample(after.text, 'email_outbox_emails{status="pending"}') == 0
+
+
+def test_if_unmatched_paths_share_one_label(setup_db):
+    client = TestClient(app=app_v1)
+
+    for i in range(3):
+        client.get(f'/random-scan-{i}')
+    text = client.get('/metrics', headers=get_metrics_headers()).text
+
+    assert 'random-scan' not in text
+    assert 'db_queries_total{route="unmatched"}' in text
+
+
+def test_if_unknown_methods_share_one_label(setup_db):
+    client = TestClient(app=app_v1)
+
+    before = client.get('/metrics', headers=get_metrics_headers()).text
+    for i in range(3):
+        assert client.request(f'X{i}', '/ping').status_code == 405
+    text = client.get('/metrics', headers=get_metrics_headers()).text
+
+    assert 'method="X' not in text
+    sample = 'http_requests_total{route="/ping",method="other",status="405"}'
+    assert get_sample(text, sample) - get_sample(before, sample) == 3
+
+def test_if_metrics_require_the_token(setup_db):
+    client = TestClient(app=app_v1)
+
+    assert client.get('/metrics').status_code == 401
+    assert client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 401
+
+    assert client.get('/metrics', headers=get_metrics_headers()).status_code == 200
+
+    # Disabled without a token
+    config = load_config()
+    api = config.api.model_copy(update={'metrics_token': None})
+    config = config.model_copy(update={'api': api})
+    app_v1.dependency_overrides[get_config] = lambda: config
+    try:
+        assert client.get('/metrics', headers=get_metrics_headers()).status_code == 404
+    finally:
+        app_v1.dependency_overrides.clear()
+
+
+def test_if_event_streams_are_not_kept_in_flight():
+    class Route:
+        path = '/stream'
+
+    async def stream_app(scope, receive, send):
+        scope['route'] = Route()
+        await send({'type': 'http.response.start', 'status': 200,
+                    'headers': [(b'content-type', b'text/event-stream')]})
+        # The stream is not in flight while it lasts
+        assert get_sample(REGISTRY.render(), 'http_requests_in_flight') == in_flight
+        await send({'type': 'http.response.body', 'body': b''})
+
+    async def send(message):
+        pass
+
+    in_flight = get_sample(REGISTRY.render(), 'http_requests_in_flight')
+    asyncio.run(MetricsMiddleware(stream_app)({'type': 'http', 'method': 'GET'}, None, send))
+    text = REGISTRY.render()
+
+    assert get_sample(text, 'http_requests_in_flight') == in_flight
+    assert get_sample(text, 'http_requests_total{route="/stream",method="GET",status="200"}') == 1
+    assert 'http_request_duration_seconds_count{route="/stream"' not in text
@@ -0,0 +1,53 @@
+import pstats
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from src.config.app_config import ProfilerSettings
+from src.routes.profiler import ProfilerMiddleware
+
+
+def create_client(settings: ProfilerSettings) -> TestClient:
+    app = FastAPI()
+    app.add_middleware(ProfilerMiddleware, settings=settings)
+
+    @app.get('/work/{n}')
+    async def work(n: int):
+        return {'sum': sum(i * i for i in range(n))}
+
+    return TestClient(app)
+
+
+def test_if_request_with_token_is_profiled(tmp_path):
+    client = create_client(ProfilerSettings(enabled=True, token='secret', output_path=tmp_path))
+
+    response = client.get('/work/1000', headers={'X-Profile': 'secret'})
+
+    profile_id = response.headers['X-Profile-Id']
+    [pstats_file] = tmp_path.glob('*.pstats')
+    [collapsed_file] = tmp_path.glob('*.collapsed')
+
+    assert pstats_file.name.startswith(profile_id)
+    assert '_GET_work-n_' in pstats_file.name
+    assert pstats.Stats(str(pstats_file)).total_calls > 0
+    for line in collapsed_file.read_text().splitlines():
+        assert int(line.rsplit(' ', 1)[1]) > 0
+
+
+def test_if_requests_without_token_are_not_profiled(tmp_path):
+    client = create_client(ProfilerSettings(enabled=True, token='secret', output_path=tmp_path))
+
+    assert 'X-Profile-Id' not in client.get('/work/10').headers
+    assert 'X-Profile-Id' not in client.get('/work/10', headers={'X-Profile': 'wrong'}).headers
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_if_sampled_profiles_are_rotated(tmp_path):
+    client = create_client(ProfilerSettings(enabled=True, sample_rate=1, max_profiles=3,
+                                            output_path=tmp_path))
+
+    profile_ids = [client.get('/work/10').headers['X-Profile-Id'] for _ in range(5)]
+
+    names = sorted(file.name for file in tmp_path.iterdir())
+    assert len(names) == 6
+    assert all(name.startswith(tuple(profile_ids[2:])) for name in names)
@@ -6,7 +6,7 @@ os.environ['APP_ENV'] = 'testing'
 from src.routes.v1 import app_v1
 from src.routes.dto import LoginData, RegistrationData, EmailVerificationDate
 
-from tests.temporal_setup import setup_backend, setup_db
+from tests.temporal_setup import setup_backend, setup_db, dispatch_emails
 from tests.local_smtp_server import smtp_server
 
 
@@ -54,6 +54,7 @@ def test_if_user_can_register_with_valid_token(smtp_server, setup_backend):
     data = RegistrationData(email=exp_email, password='123', invitation_token=invitation_token)
     response = client.post('/user-register', json=data.model_dump())
     assert response.status_code == 200
+    dispatch_emails()
 
     token = smtp_server.handler.get_latest_message().get_token()
     act_email = smtp_server.handler.get_latest_message().get_first_recipient()
@@ -81,6 +82,7 @@ def test_if_user_can_register_with_another_email_before_validation(smtp_server,
     data = RegistrationData(email=exp_email0, password='123', invitation_token=invitation_token)
     response = client.post('/user-register', json=data.model_dump())
     assert response.status_code == 200
+    dispatch_emails()
 
     first_token = smtp_server.handler.get_latest_message().get_token()
     act_email = smtp_server.handler.get_latest_message().get_first_recipient()
@@ -92,6 +94,7 @@ def test_if_user_can_register_with_another_email_before_validation(smtp_server,
     data = RegistrationData(email=exp_email1, password='123', invitation_token=invitation_token)
     response = client.post('/user-register', json=data.model_dump())
     assert response.status_code == 200
+    dispatch_emails()
 
     second_token = smtp_server.handler.get_latest_message().get_token()
     act_email = smtp_server.handler.get_latest_message().get_first_recipient()
@@ -124,6 +127,7 @@ def test_if_user_cannot_register_with_another_email_after_verification(smtp_serv
     data = RegistrationData(email=exp_email0, password='123', invitation_token=invitation_token)
     response = client.post('/user-register', json=data.model_dump())
     assert response.status_code == 200
+    dispatch_emails()
 
     token = smtp_server.handler.get_latest_message().get_token()
     act_email = smtp_server.handler.get_latest_message().get_first_recipient()
@@ -156,6 +160,7 @@ def test_if_registered_user_can_login(smtp_server, setup_backend):
     data = RegistrationData(email=exp_email, password=password, invitation_token=invitation_token)
     response = client.post('/user-register', json=data.model_dump())
     assert response.status_code == 200
+    dispatch_emails()
 
     token = smtp_server.handler.get_latest_message().get_token()
     act_email = smtp_server.handler.get_latest_message().get_first_recipient()
@@ -0,0 +1,120 @@
+import os
+import asyncio
+
+import orjson
+from fastapi.testclient import TestClient
+
+os.environ['APP_ENV'] = 'testing'
+
+from src.business_logic.rsvp_events import RsvpEventBroker, rsvp_events, stream_events
+from src.business_logic.services import Service
+from src.config.app_config import load_config
+from src.database.db import get_session_factory
+from src.database.db_tables import Guest, User
+from src.routes.dto import GuestDto
+from src.routes.v1 import app_v1
+
+from tests.temporal_setup import setup_db, add_family
+
+
+def parse_event(message: bytes) -> dict:
+    fields = dict(line.split(': ', 1) for line in message.decode().strip().split('\n'))
+    return {'id': int(fields['id']), 'event': fields['event'], 'data': orjson.loads(fields['data'])}
+
+
+def test_if_events_are_delivered_to_all_subscribers():
+    broker = RsvpEventBroker()
+
+    async def run():
+        first, second = broker.subscribe(), broker.subscribe()
+        # Services publish from worker threads
+        await asyncio.to_thread(broker.publish, 'registration', {'user_id': 1})
+        await asyncio.to_thread(broker.publish, 'email_verified', {'user_id': 1})
+        return [await first.get(), await first.get(), await second.get()]
+
+    first, second, other = [parse_event(m) for m in asyncio.run(run())]
+
+    assert first == {'id': 1, 'event': 'registration', 'data': {'user_id': 1}}
+    assert second['id'] == 2 and second['event'] == 'email_verified'
+    assert other == first
+
+
+def test_if_slow_subscribers_are_dropped():
+    broker = RsvpEventBroker(queue_size=2)
+
+    async def run():
+        slow = broker.subscribe()
+        for i in range(3):
+            broker.publish('registration', {'user_id': i})
+        # Deliveries run on the loop of the subscriber
+        await asyncio.sleep(0)
+        return await slow.get()
+
+    assert asyncio.run(run()) is None
+    assert broker.dropped == 1
+    assert broker.get_subscriber_count() == 0
+
+
+def test_if_idle_stream_sends_heartbeats():
+    broker = RsvpEventBroker(queue_size=1)
+
+    async def run():
+        stream = stream_events(broker, heartbeat_interval=0.01)
+        # Not subscribed before the stream is iterated
+        assert broker.get_subscriber_count() == 0
+
+        chunks = [await stream.__anext__(), await stream.__anext__()]
+
+        broker.publish('registration', {'user_id': 1})
+        broker.publish('registration', {'user_id': 2})
+        chunks += [chunk async for chunk in stream]
+        return chunks
+
+    chunks = asyncio.run(run())
+
+    assert chunks == [b': connected\n\n', b': heartbeat\n\n', b'event: dropped\ndata: {}\n\n']
+    assert broker.get_subscriber_count() == 0
+
+
+def test_if_guest_updates_are_published_after_commit(setup_db):
+    email = 'family@mail.com'
+    add_family(email, 2)
+
+    def update_guests():
+        with get_session_factory()() as session:
+            user = session.query(User).filter_by(email=email).first()
+            guest_dtos = [GuestDto(id=guest.id, first_name=guest.first_name,
+                                   last_name=guest.last_name, joins=True, food_option=2,
+                                   dessert_option=1, allergies='', favorite_tool='',
+                                   favorite_fairy_tale_character='')
+                          for guest in user.associated_guests]
+            Service(session, load_config()).update_guests_of_user(guest_dtos, user)
+
+    async def run():
+        subscription = rsvp_events.subscribe()
+        try:
+            await asyncio.to_thread(update_guests)
+            return await subscription.get()
+        finally:
+            rsvp_events.unsubscribe(subscription)
+
+    event = parse_event(asyncio.run(run()))
+
+    assert event['event'] == 'guests_updated'
+    assert [(g['status'], g['food_option'], g['dessert_option'])
+            for g in event['data']['guests']] == [('REGISTERED', 'OMNIVOR', 'CHEESE')] * 2
+
+    with get_session_factory()() as session:
+        assert session.query(Guest).filter_by(id=event['data']['guests'][0]['id']).one()\
+            .food_option.name == 'OMNIVOR'
+
+
+def test_if_event_stream_is_for_admins_only(setup_db):
+    add_family('family@mail.com', 1)
+    token = Service(None, load_config())._create_access_token('family@mail.com')
+
+    response = TestClient(app=app_v1).get('/admin/events',
+                                          headers={'Authorization': f'Bearer {token}'})
+
+    assert response.status_code == 403
+    assert rsvp_events.get_subscriber_count() == 0
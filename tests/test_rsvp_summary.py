@@ -0,0 +1,78 @@
+import os
+import asyncio
+
+from fastapi.testclient import TestClient
+
+os.environ['APP_ENV'] = 'testing'
+
+from src.business_logic.rsvp_summary import get_rsvp_summary, rebuild_rsvp_summary
+from src.database.db import get_session_factory, get_async_session_factory
+from src.routes.dto import GuestDto
+from src.routes.v1 import app_v1
+
+from tests.temporal_setup import setup_db, add_family, get_headers, get_admin_headers
+
+
+def update_guests(client: TestClient, email: str, joins: list, food_option: int = 1):
+    guests = client.get('/guest-info', headers=get_headers(email)).json()['guests']
+    data = [GuestDto(id=g['id'], first_name=g['first_name'], last_name=g['last_name'],
+                     joins=j, food_option=food_option, dessert_option=2, allergies='',
+                     favorite_fairy_tale_character='', favorite_tool='').model_dump()
+            for g, j in zip(guests, joins)]
+
+    response = client.post('/guest-info', json=data, headers=get_headers(email))
+    assert response.status_code == 200
+
+
+def get_rebuilt_summary() -> dict:
+    with get_session_factory()() as session:
+        rebuild_rsvp_summary(session)
+        session.commit()
+
+    async def get_summary():
+        async with get_async_session_factory()() as db:
+            return await get_rsvp_summary(db)
+
+    return asyncio.run(get_summary()).model_dump()
+
+
+def test_if_summary_is_counted_from_guest_list(setup_db):
+    response = TestClient(app=app_v1).get('/admin/rsvp-summary', headers=get_admin_headers())
+
+    assert response.status_code == 200
+    assert response.json() == {
+        'status': {'UNDEFINED': 6, 'REGISTERED': 0, 'EXCUSED': 0},
+        'food_option': {'UNDEFINED': 6, 'VEGETARIAN': 0, 'OMNIVOR': 0},
+        'dessert_option': {'UNDEFINED': 6, 'CHEESE': 0, 'SWEET': 0},
+    }
+
+
+def test_if_summary_is_updated_by_difference(setup_db):
+    add_family('family@mail.com', 3)
+    client = TestClient(app=app_v1)
+    headers = get_admin_headers()
+
+    update_guests(client, 'family@mail.com', [True, True, False])
+    summary = client.get('/admin/rsvp-summary', headers=headers).json()
+
+    assert summary['status'] == {'UNDEFINED': 6, 'REGISTERED': 2, 'EXCUSED': 1}
+    assert summary['food_option'] == {'UNDEFINED': 6, 'VEGETARIAN': 3, 'OMNIVOR': 0}
+    assert summary['dessert_option'] == {'UNDEFINED': 6, 'CHEESE': 0, 'SWEET': 3}
+
+    # Changing answers moves guests between options instead of counting them again
+    update_guests(client, 'family@mail.com', [False, True, False], food_option=2)
+    update_guests(client, 'family@mail.com', [False, True, False], food_option=2)
+    summary = client.get('/admin/rsvp-summary', headers=headers).json()
+
+    assert summary['status'] == {'UNDEFINED': 6, 'REGISTERED': 1, 'EXCUSED': 2}
+    assert summary['food_option'] == {'UNDEFINED': 6, 'VEGETARIAN': 0, 'OMNIVOR': 3}
+    assert summary == get_rebuilt_summary()
+
+
+def test_if_summary_is_for_admins_only(setup_db):
+    add_family('family@mail.com', 1)
+
+    response = TestClient(app=app_v1).get('/admin/rsvp-summary',
+                                          headers=get_headers('family@mail.com'))
+
+    assert response.status_code == 403
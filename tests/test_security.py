@@ -0,0 +1,102 @@
+import os
+import asyncio
+import threading
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from src.business_logic.services import AsyncService, Service
+from src.config.app_config import SecuritySettings, load_config
+from src.database.db_tables import User
+from src.database.models.user_status import UserStatus
+from src.routes.dto import RegistrationData, ResetPasswordRequestDto
+from src.security import (
+    PasswordHashingBusyError,
+    configure_password_hashing,
+    hash_password,
+    hash_password_async,
+    verify_password,
+    _run_in_hash_pool,
+)
+
+
+@pytest.fixture
+def hashing_settings():
+    def configure(**kwargs):
+        configure_password_hashing(SecuritySettings(**kwargs))
+
+    yield configure
+
+    configure_password_hashing(SecuritySettings())
+
+
+def test_if_password_is_hashed_in_pool(hashing_settings):
+    hashing_settings(bcrypt_rounds=4)
+
+    password_hash = asyncio.run(hash_password_async('123'))
+
+    assert password_hash.startswith('$2b$04$')
+    assert verify_password('123', password_hash)
+
+
+def test_if_saturated_pool_fails_fast(hashing_settings):
+    hashing_settings(hash_workers=1, hash_queue_size=1)
+    release = threading.Event()
+
+    async def saturate():
+        blocked = [asyncio.ensure_future(_run_in_hash_pool(release.wait)) for _ in range(2)]
+        await asyncio.sleep(0)
+
+        with pytest.raises(PasswordHashingBusyError):
+            await _run_in_hash_pool(release.wait)
+
+        release.set()
+        await asyncio.gather(*blocked)
+
+        # Slots are free again
+        await _run_in_hash_pool(release.wait)
+
+    asyncio.run(saturate())
+
+
+def test_if_password_is_rehashed_on_login_with_other_cost(hashing_settings):
+    os.environ['APP_ENV'] = 'testing'
+    hashing_settings(bcrypt_rounds=5)
+
+    db_user = User(email='test@mail.com', status=UserStatus.VERIFIED,
+                   password_hash=hash_password('123'))
+    hashing_settings(bcrypt_rounds=4)
+
+    db = MagicMock()
+    db.query.return_value.filter_by.return_value.first.return_value = db_user
+
+    Service(db=db, config=load_config()).login('test@mail.com', '123')
+
+    assert db_user.password_hash.startswith('$2b$04$')
+    assert verify_password('123', db_user.password_hash)
+    db.commit.assert_called_once()
+
+
+def test_if_tokens_are_checked_before_hashing():
+    os.environ['APP_ENV'] = 'testing'
+
+    # No user is found for the tokens
+    session = MagicMock()
+    session.query.return_value.filter_by.return_value.first.return_value = None
+
+    async def run_sync(method):
+        return method(session)
+
+    service = AsyncService(db=MagicMock(run_sync=run_sync), config=load_config())
+
+    async def request():
+        with pytest.raises(AttributeError):
+            await service.register_user(RegistrationData(email='test@mail.com', password='123',
+                                                         invitation_token='unknown'))
+        with pytest.raises(AttributeError):
+            await service.reset_password(ResetPasswordRequestDto(token='unknown', password='123'))
+
+    with patch('src.business_logic.services.hash_password_async') as hash_password_mock:
+        asyncio.run(request())
+
+    hash_password_mock.assert_not_called()
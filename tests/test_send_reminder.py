@@ -0,0 +1,57 @@
+import os
+import time
+
+os.environ['APP_ENV'] = 'testing'
+
+from src.setup.send_reminder import Checkpoint, RateLimiter, send_reminders
+
+from tests.temporal_setup import temp_directory
+from tests.local_smtp_server import smtp_server
+
+
+EMAIL_DICT = {
+    f'guest{i}@mail.com': [('female', f'Ava{i}'), ('male', f'Juan{i}')] for i in range(5)
+}
+
+
+def test_if_reminders_are_sent(smtp_server):
+    prev_mail_count = smtp_server.handler.count_messages()
+
+    stats = send_reminders(EMAIL_DICT, workers=3, rate_per_minute=0)
+
+    assert stats == {'sent': 5, 'skipped': 0, 'failed': 0}
+    assert smtp_server.handler.count_messages() == prev_mail_count + 5
+
+
+def test_if_interrupted_run_is_resumed_from_checkpoint():
+    sent, failed = [], []
+
+    def flaky_send(guests, receiver_email):
+        if receiver_email == 'guest2@mail.com' and not failed:
+            failed.append(receiver_email)
+            raise ConnectionResetError('Connection dropped')
+        sent.append(receiver_email)
+
+    with temp_directory() as temp_dir:
+        path = temp_dir / 'reminders.csv.sent'
+
+        stats = send_reminders(EMAIL_DICT, checkpoint=Checkpoint(path), workers=1,
+                               rate_per_minute=0, send=flaky_send)
+        assert stats == {'sent': 4, 'skipped': 0, 'failed': 1}
+
+        # Only the failed address is sent by the next run
+        sent.clear()
+        stats = send_reminders(EMAIL_DICT, checkpoint=Checkpoint(path), workers=1,
+                               rate_per_minute=0, send=flaky_send)
+        assert stats == {'sent': 1, 'skipped': 4, 'failed': 0}
+        assert sent == ['guest2@mail.com']
+
+
+def test_if_rate_limit_spreads_calls():
+    limiter = RateLimiter(per_minute=600)
+
+    start = time.monotonic()
+    for i in range(4):
+        limiter.wait()
+
+    assert time.monotonic() - start >= 0.3
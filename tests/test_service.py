@@ -219,3 +219,28 @@ def test_if_can_update_initial_guest_of_user(mock_db):
     assert response.guests[0].joins == True
     assert response.guests[0].allergies == g1.allergies
     assert response.guests[0].food_option == g1.food_option.value
+
+
+def test_if_invalid_guest_options_are_rejected_before_writing(mock_db):
+    os.environ['APP_ENV'] = 'testing'
+    config = load_config()
+
+    g1 = Guest()
+    g1.id = 0
+
+    guest_dto = GuestDto(id=g1.id, first_name='', last_name='', joins=True,
+                         food_option=42, dessert_option=DessertOption.CHEESE.value,
+                         allergies='', favorite_fairy_tale_character='', favorite_tool='')
+
+    db_user = User()
+    db_user.associated_guests = [g1]
+
+    db, _, _ = mock_db
+
+    s = Service(db=db, config=config)
+
+    with pytest.raises(AttributeError):
+        s.update_guests_of_user(guest_dtos=[guest_dto], user=db_user)
+
+    db.execute.assert_not_called()
+    db.commit.assert_not_called()
@@ -0,0 +1,69 @@
+import os
+
+from fastapi.testclient import TestClient
+
+os.environ['APP_ENV'] = 'testing'
+
+from src.business_logic.services import Service
+from src.business_logic.user_cache import CachedUser, UserCache, user_cache
+from src.config.app_config import load_config
+from src.database.models.user_status import UserStatus
+from src.routes.v1 import app_v1
+
+from tests.temporal_setup import setup_db, add_family
+
+
+def cached_user(id: int) -> CachedUser:
+    return CachedUser(id=id, email=f'{id}@mail.com', status=UserStatus.VERIFIED,
+                      guest_ids=frozenset([id]))
+
+
+def test_if_least_recently_used_user_is_evicted():
+    cache = UserCache(max_size=2, ttl=60)
+
+    cache.put(cached_user(1))
+    cache.put(cached_user(2))
+    cache.get('1@mail.com')
+    cache.put(cached_user(3))
+
+    assert cache.get('2@mail.com') is None
+    assert cache.get('1@mail.com') == cached_user(1)
+    assert cache.get_stats() == {'hits': 2, 'misses': 1, 'evictions': 1, 'size': 2}
+
+
+def test_if_expired_user_is_not_returned():
+    cache = UserCache(max_size=2, ttl=-1)
+
+    cache.put(cached_user(1))
+
+    assert cache.get('1@mail.com') is None
+
+
+def test_if_user_can_be_invalidated():
+    cache = UserCache()
+
+    cache.put(cached_user(1))
+    cache.invalidate(None, '1@mail.com')
+
+    assert cache.get('1@mail.com') is None
+
+
+def test_if_cached_user_needs_no_auth_query(setup_db):
+    email = 'family@mail.com'
+    add_family(email, 3)
+
+    token = Service(db=None, config=load_config())._create_access_token(email)
+    headers = {'Authorization': f'Bearer {token}'}
+    client = TestClient(app=app_v1)
+
+    response = client.get('/guest-info', headers=headers)
+    assert response.status_code == 200
+    assert len(response.json()['guests']) == 3
+
+    hits = user_cache.hits
+    response = client.get('/guest-info', headers=headers)
+
+    assert user_cache.hits == hits + 1
+    # Revision for the ETag and guests only
+    assert '2 queries' in response.headers['Server-Timing']
+    assert len(response.json()['guests']) == 3